@@ -29,6 +29,7 @@ setup(
     author_email="white@pfel.ru",
     description="Simple Tochka Bank Open API client",
     install_requires=requirements(),
+    extras_require={"http2": ["httpx[http2]"]},
     project_urls={
         "Source code": "https://github.com/WhiteApfel/tochka-api",
         "Write me": "https://t.me/whiteapfel",
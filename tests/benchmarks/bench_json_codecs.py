@@ -0,0 +1,66 @@
+"""
+Сравнение разбора большой страницы sbp_get_payments:
+прежний путь ``ujson.loads(response.text)`` против ``JsonCodec.loads(response.content)``
+
+Запуск: ``PYTHONPATH=tochka_api python tests/benchmarks/bench_json_codecs.py``
+"""
+
+import timeit
+
+import ujson
+from httpx import Response
+from json_codecs import OrjsonCodec, UjsonCodec
+from models.responses import SbpPaymentsResponse
+
+PER_PAGE = 1000
+NUMBER = 200
+
+
+def make_page(per_page: int = PER_PAGE) -> bytes:
+    payments = [
+        {
+            "qrcId": f"AS1000{i:026d}",
+            "status": "Accepted",
+            "message": "Платёж успешно проведён",
+            "refTransactionId": f"A{i:031d}",
+        }
+        for i in range(per_page)
+    ]
+    return ujson.dumps(
+        {"Data": {"Payments": payments}, "Links": {}, "Meta": {"totalPages": 1}},
+        ensure_ascii=False,
+    ).encode()
+
+
+def main():
+    body = make_page()
+    orjson_codec, ujson_codec = OrjsonCodec(), UjsonCodec()
+
+    def fresh_response() -> Response:
+        # ``Response.text`` кэшируется, поэтому каждый прогон получает новый ответ
+        return Response(200, content=body, headers={"Content-Type": "application/json"})
+
+    cases = {
+        "ujson.loads(response.text)": lambda: ujson.loads(fresh_response().text),
+        "UjsonCodec.loads(response.content)": lambda: ujson_codec.loads(
+            fresh_response().content
+        ),
+        "OrjsonCodec.loads(response.content)": lambda: orjson_codec.loads(
+            fresh_response().content
+        ),
+        "ujson.loads(response.text) + model": lambda: SbpPaymentsResponse(
+            **ujson.loads(fresh_response().text)
+        ),
+        "OrjsonCodec.loads(response.content) + model": lambda: SbpPaymentsResponse(
+            **orjson_codec.loads(fresh_response().content)
+        ),
+    }
+
+    print(f"page: {PER_PAGE} payments, {len(body) / 1024:.0f} KiB, {NUMBER} runs")
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=NUMBER, repeat=5))
+        print(f"{name:<45} {seconds / NUMBER * 1e6:10.1f} us/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+import pytest
+from circuit_breaker import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    CircuitBreaker,
+)
+from exceptions import TochkaCircuitOpenError, TochkaServerError
+from modules import TochkaAPI
+from token_manager import InMemoryTokenManager
+
+FAMILY = "/open-banking/v1.0/accounts"
+
+
+def test_circuit_opens_probes_and_closes():
+    statuses = [503, 503, 200, 200]
+    requests = []
+    probe_started = asyncio.Event()
+    probe_release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if len(requests) == 3:
+            probe_started.set()
+            await probe_release.wait()
+        return httpx.Response(
+            statuses[len(requests) - 1],
+            json={"Data": {"Account": []}, "Links": {}, "Meta": {}},
+        )
+
+    circuit_breaker = CircuitBreaker(min_requests=2, open_timeout=0.1)
+
+    async def main():
+        api = TochkaAPI(
+            "client_id",
+            "client_secret",
+            token_manager=InMemoryTokenManager,
+            http_transport=httpx.MockTransport(handler),
+            circuit_breaker=circuit_breaker,
+        )
+        tokens = api.token_manager.get_tokens("user", allow_create=True)
+        tokens.access = "access", 3600
+        api._customer_code = "user"
+
+        for _ in range(2):
+            with pytest.raises(TochkaServerError):
+                await api.get_accounts()
+        assert circuit_breaker.state(FAMILY) == CIRCUIT_OPEN
+        with pytest.raises(TochkaCircuitOpenError):
+            await api.get_accounts()
+        assert len(requests) == 2
+
+        await asyncio.sleep(0.1)
+        probe = asyncio.create_task(api.get_accounts())
+        await probe_started.wait()
+        assert circuit_breaker.state(FAMILY) == CIRCUIT_HALF_OPEN
+        # пока идёт пробный запрос, остальные не отправляются
+        with pytest.raises(TochkaCircuitOpenError):
+            await api.get_account("account")
+        probe_release.set()
+        await probe
+        assert circuit_breaker.state(FAMILY) == CIRCUIT_CLOSED
+
+        await api.get_accounts()
+        await api.aclose()
+
+    asyncio.run(main())
+    assert len(requests) == 4
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from modules import TochkaAPI
+from rate_limiter import (
+    ENDPOINT_GROUP_OPEN_BANKING,
+    ENDPOINT_GROUP_SBP,
+    RateLimiter,
+    TokenBucket,
+)
+from token_manager import InMemoryTokenManager
+
+SBP_URL = "/sbp/v1.0/qr-code/legal-entity/entity"
+
+
+@pytest.mark.parametrize("rate, burst", [(0, None), (-1, None), (1, 0.5)])
+def test_invalid_limits_rejected(rate, burst):
+    with pytest.raises(ValueError):
+        TokenBucket(rate, burst)
+    with pytest.raises(ValueError):
+        RateLimiter(rate, burst)
+    with pytest.raises(ValueError):
+        RateLimiter(group_limits={ENDPOINT_GROUP_SBP: (rate, burst)})
+
+
+def test_idle_user_buckets_evicted():
+    rate_limiter = RateLimiter(
+        group_limits={ENDPOINT_GROUP_SBP: (1000, 1)}, max_idle_buckets=8
+    )
+
+    async def send():
+        return httpx.Response(200)
+
+    async def main():
+        for number in range(100):
+            await rate_limiter.call(send, f"user-{number}", SBP_URL)
+            await asyncio.sleep(0.002)  # корзина успевает снова заполниться
+
+    asyncio.run(main())
+    assert len(rate_limiter._group_buckets) <= 16
+
+
+def test_paused_bucket_not_evicted():
+    rate_limiter = RateLimiter(
+        group_limits={ENDPOINT_GROUP_SBP: (1000, 1)}, max_idle_buckets=1
+    )
+    paused = rate_limiter.buckets_for("paused", SBP_URL)[-1]
+    paused.pause(60)
+    for number in range(10):
+        rate_limiter.buckets_for(f"user-{number}", SBP_URL)
+
+    assert rate_limiter.buckets_for("paused", SBP_URL)[-1] is paused
+
+
+def test_throttled_request_paused_and_resumed():
+    sent_at = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent_at.append(time.monotonic())
+        if len(sent_at) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.2"}, json={})
+        return httpx.Response(
+            200, json={"Data": {"Account": []}, "Links": {}, "Meta": {}}
+        )
+
+    async def main():
+        api = TochkaAPI(
+            "client_id",
+            "client_secret",
+            token_manager=InMemoryTokenManager,
+            http_transport=httpx.MockTransport(handler),
+            rate_limiter=RateLimiter(
+                group_limits={ENDPOINT_GROUP_OPEN_BANKING: (1000, 10)}
+            ),
+        )
+        tokens = api.token_manager.get_tokens("user", allow_create=True)
+        tokens.access = "access", 3600
+        api._customer_code = "user"
+        first = asyncio.create_task(api.get_accounts())
+        await asyncio.sleep(0.05)
+        # пока корзина на паузе, новые запросы тоже ждут
+        await api.get_account("account")
+        await first
+        await api.aclose()
+
+    asyncio.run(main())
+    assert len(sent_at) == 3
+    assert sent_at[1] - sent_at[0] >= 0.2
+    assert sent_at[2] - sent_at[0] >= 0.2
@@ -0,0 +1,210 @@
+import asyncio
+import multiprocessing
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from modules import TochkaAPI
+from token_manager import LocalStorageTokenManager, SqliteTokenManager
+
+PROCESSES = 4
+
+
+def refresh_in_process(db_path, barrier, refresh_calls, results):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/connect/token":
+            with refresh_calls.get_lock():
+                refresh_calls.value += 1
+                number = refresh_calls.value
+            await asyncio.sleep(0.2)
+            return httpx.Response(
+                200,
+                json={
+                    "access_token": f"access-{number}",
+                    "refresh_token": f"refresh-{number}",
+                    "expires_in": 3600,
+                },
+            )
+        return httpx.Response(200, json={})
+
+    async def main():
+        api = TochkaAPI(
+            "client_id",
+            "client_secret",
+            token_manager=SqliteTokenManager,
+            db_path=db_path,
+            http_transport=httpx.MockTransport(handler),
+        )
+        barrier.wait()
+        await api.request(method="GET", url="/open-banking/v1.0/accounts")
+        results.put(str(api.token_manager.get_tokens("user").access))
+        await api.aclose()
+
+    asyncio.run(main())
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="requires fork"
+)
+def test_one_process_refreshes_shared_tokens(tmp_path):
+    db_path = str(tmp_path / "tokens.sqlite3")
+    token_manager = SqliteTokenManager("client_id", db_path=db_path)
+    tokens = token_manager.get_tokens("user", allow_create=True)
+    tokens.access = "access-0", 0  # уже истёк
+    tokens.refresh = "refresh-0", 3600
+    token_manager.connection.close()
+
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(PROCESSES)
+    refresh_calls = context.Value("i", 0)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=refresh_in_process,
+            args=(db_path, barrier, refresh_calls, results),
+        )
+        for _ in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    assert refresh_calls.value == 1
+    assert [results.get(timeout=1) for _ in range(PROCESSES)] == ["access-1"] * 4
+
+
+def write_other_user(db_path):
+    token_manager = SqliteTokenManager("client_id", db_path=db_path)
+    tokens = token_manager.get_tokens("other", allow_create=True)
+    tokens.access = "other-access", 3600
+    token_manager.connection.close()
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="requires fork"
+)
+def test_sqlite_sync_skips_own_writes(tmp_path):
+    db_path = str(tmp_path / "tokens.sqlite3")
+    token_manager = SqliteTokenManager("client_id", db_path=db_path)
+    tokens = token_manager.get_tokens("user", allow_create=True)
+    tokens.access = "access-1", 3600
+    tokens.refresh = "refresh-1", 3600
+
+    # запись другого процесса: версии этого процесса идут уже не подряд
+    process = multiprocessing.get_context("fork").Process(
+        target=write_other_user, args=(db_path,)
+    )
+    process.start()
+    process.join(timeout=30)
+    assert process.exitcode == 0
+
+    save_row = token_manager.save_row
+
+    def save_row_then_sync(user_code, tokens_data):
+        version = save_row(user_code, tokens_data)
+        if tokens_data["refresh"]["value"] == "refresh-1":
+            # sync между записями нового access и нового refresh
+            token_manager.sync(force=True)
+        return version
+
+    token_manager.save_row = save_row_then_sync
+
+    async def main():
+        tokens.access = "access-2", 3600
+        tokens.refresh = "refresh-2", 3600
+        await token_manager.aflush()
+
+    asyncio.run(main())
+
+    assert tokens.refresh == "refresh-2"
+    assert token_manager.reload_tokens("user").refresh == "refresh-2"
+    assert token_manager.get_tokens("other").access == "other-access"
+    other = SqliteTokenManager("client_id", db_path=db_path)
+    assert other.get_tokens("user").refresh == "refresh-2"
+
+
+def test_local_storage_writes_only_changed_users(tmp_path):
+    tokens_path = str(tmp_path / "tokens.json")
+    (tmp_path / "tokens.json").touch()
+    token_manager = LocalStorageTokenManager("client_id", tokens_path=tokens_path)
+    for user_code in ("x", "y"):
+        tokens = token_manager.get_tokens(user_code, allow_create=True)
+        tokens.access = f"{user_code}-access-1", 3600
+        tokens.refresh = f"{user_code}-refresh-1", 3600
+
+    async def main():
+        first = LocalStorageTokenManager("client_id", tokens_path=tokens_path)
+        second = LocalStorageTokenManager("client_id", tokens_path=tokens_path)
+        first.load_tokens()
+        second.load_tokens()
+
+        async with second.refresh_lease("y"):
+            second.reload_tokens("y").refresh = "y-refresh-2", 3600
+            await second.aflush()
+        # first не видел обновления y и не должен затереть его своей копией
+        async with first.refresh_lease("x"):
+            first.reload_tokens("x").refresh = "x-refresh-2", 3600
+            await first.aflush()
+
+        async with second.refresh_lease("y"):
+            assert second.reload_tokens("y").refresh == "y-refresh-2"
+        return first._read()
+
+    tokens_data = asyncio.run(main())
+    assert tokens_data["x"]["refresh"]["value"] == "x-refresh-2"
+    assert tokens_data["y"]["refresh"]["value"] == "y-refresh-2"
+
+
+def test_refresh_uses_reloaded_tokens(tmp_path):
+    db_path = str(tmp_path / "tokens.sqlite3")
+    posted = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posted.append(parse_qs(request.content.decode())["refresh_token"][0])
+        return httpx.Response(
+            200,
+            json={
+                "access_token": f"access-{len(posted)}-new",
+                "refresh_token": f"refresh-{len(posted)}-new",
+                "expires_in": 3600,
+            },
+        )
+
+    async def rotate_in_other_process(access_expires_in: int, number: int):
+        other = SqliteTokenManager("client_id", db_path=db_path)
+        tokens = other.get_tokens("user")
+        tokens.access = f"access-{number}", access_expires_in
+        tokens.refresh = f"refresh-{number}", 3600
+        await other.aflush()
+
+    async def main():
+        api = TochkaAPI(
+            "client_id",
+            "client_secret",
+            token_manager=SqliteTokenManager,
+            db_path=db_path,
+            sync_interval=60,
+            http_transport=httpx.MockTransport(handler),
+        )
+        tokens = api.token_manager.get_tokens("user", allow_create=True)
+        tokens.access = "access-1", 0
+        tokens.refresh = "refresh-1", 3600
+        await api.token_manager.aflush()
+
+        # другой процесс сменил refresh-токен, но его access уже истёк
+        await rotate_in_other_process(0, 2)
+        refreshed = await api._refresh_tokens_single_flight("user")
+        # access другого процесса ещё действует: повторного обновления нет
+        await rotate_in_other_process(3600, 3)
+        reused = await api._refresh_tokens_single_flight("user")
+        await api.aclose()
+        return refreshed, reused
+
+    refreshed, reused = asyncio.run(main())
+
+    assert posted == ["refresh-2"]
+    assert refreshed == ("access-1-new", "refresh-1-new", 3600)
+    assert reused[:2] == ("access-3", "refresh-3")
+    assert type(reused[0]) is str and 3500 < reused[2] <= 3600
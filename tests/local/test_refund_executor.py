@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import httpx
+from modules import TochkaAPI
+from refund_executor import (
+    JOURNAL_NOT_SENT,
+    JOURNAL_SUBMIT_FAILED,
+    JOURNAL_SUBMITTING,
+    RefundJournal,
+)
+from token_manager import InMemoryTokenManager
+
+
+class Bank:
+    """
+    Мок API возвратов: ``create`` решает, что вернуть на POST /refund
+    """
+
+    def __init__(self, create=None, status: str = "Accepted"):
+        self.create = create or (lambda trx_id: None)
+        self.status = status
+        self.posted: list[str] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            trx_id = json.loads(request.content)["Data"]["refTransactionId"]
+            self.posted.append(trx_id)
+            response = self.create(trx_id)
+            if response is not None:
+                return response
+            return self.ok({"requestId": f"request-{trx_id}", "status": "Initiated"})
+        request_id = request.url.path.rsplit("/", 1)[1]
+        return self.ok({"requestId": request_id, "status": self.status})
+
+    @staticmethod
+    def ok(data: dict) -> httpx.Response:
+        return httpx.Response(200, json={"Data": data, "Links": {}, "Meta": {}})
+
+
+def run_refunds(bank: Bank, journal_path, trx_ids, **params) -> dict:
+    async def main():
+        api = TochkaAPI(
+            "client_id",
+            "client_secret",
+            token_manager=InMemoryTokenManager,
+            http_transport=httpx.MockTransport(bank.handler),
+        )
+        tokens = api.token_manager.get_tokens("user", allow_create=True)
+        tokens.access = "access", 3600
+        tokens.refresh = "refresh", 3600
+        api._customer_code = "user"
+        refunds = api.sbp_start_refunds(
+            ({"trx_id": trx_id, "qrc_id": "qrc", "amount": 100} for trx_id in trx_ids),
+            journal_path,
+            poll_interval=0.01,
+            account="account/bic",
+            **params,
+        )
+        results = await refunds.run()
+        await api.aclose()
+        return {result.trx_id: result for result in results}
+
+    return asyncio.run(main())
+
+
+def journal_statuses(journal_path) -> dict:
+    return {
+        trx_id: record["status"]
+        for trx_id, record in RefundJournal(journal_path).load().items()
+    }
+
+
+def test_refunds_deduplicated_and_polled(tmp_path):
+    bank = Bank()
+    results = run_refunds(bank, tmp_path / "journal", ["a", "b", "a"])
+
+    assert sorted(bank.posted) == ["a", "b"]
+    assert {trx_id: result.ok for trx_id, result in results.items()} == {
+        "a": True,
+        "b": True,
+    }
+    assert journal_statuses(tmp_path / "journal") == {"a": "Accepted", "b": "Accepted"}
+
+
+def test_rerun_does_not_resubmit(tmp_path):
+    bank = Bank(status="WaitingForAccept")
+    results = run_refunds(bank, tmp_path / "journal", ["a"], max_poll_time=0.05)
+    assert results["a"].status == "WaitingForAccept"
+
+    bank.status = "Accepted"
+    results = run_refunds(bank, tmp_path / "journal", ["a"])
+
+    assert bank.posted == ["a"]
+    assert results["a"].ok and results["a"].resumed
+
+
+def test_unparsed_response_is_not_resubmitted(tmp_path):
+    # банк создал возврат, но ответ не разобрался: повторять нельзя
+    bank = Bank(
+        create=lambda trx_id: Bank.ok({"requestId": trx_id, "status": "Unknown"})
+    )
+    results = run_refunds(bank, tmp_path / "journal", ["a", "b"])
+
+    assert all(result.status == JOURNAL_SUBMITTING for result in results.values())
+    run_refunds(bank, tmp_path / "journal", ["a", "b"])
+    assert sorted(bank.posted) == ["a", "b"]
+
+
+def test_lost_response_is_not_resubmitted(tmp_path):
+    def create(trx_id):
+        raise httpx.ReadTimeout("response lost")
+
+    bank = Bank(create=create)
+    results = run_refunds(bank, tmp_path / "journal", ["a"])
+    assert results["a"].status == JOURNAL_SUBMITTING
+
+    bank.create = lambda trx_id: None
+    results = run_refunds(bank, tmp_path / "journal", ["a"])
+    assert bank.posted == ["a"]
+    assert results["a"].error is not None and results["a"].resumed
+
+    results = run_refunds(bank, tmp_path / "journal", ["a"], resubmit_interrupted=True)
+    assert bank.posted == ["a", "a"]
+    assert results["a"].ok
+
+
+def test_crash_after_post_is_not_resubmitted(tmp_path):
+    journal_path = tmp_path / "journal"
+    # процесс упал между записью Submitting и ответом банка
+    journal_path.write_bytes(
+        b'{"trx_id":"a","status":"Submitting","request_id":null}\n'
+        b'{"trx_id":"b","status":"Initiated","request_id":"request-b"}\n'
+        b'{"trx_'
+    )
+    bank = Bank()
+    results = run_refunds(bank, journal_path, ["a", "b"])
+
+    assert bank.posted == []
+    assert results["a"].status == JOURNAL_SUBMITTING
+    assert results["b"].ok and results["b"].resumed
+    assert journal_statuses(journal_path)["b"] == "Accepted"
+
+
+def test_rejected_requests(tmp_path):
+    def create(trx_id):
+        if trx_id == "throttled":
+            return httpx.Response(429, json={"message": "too many requests"})
+        return httpx.Response(400, json={"message": "bad request"})
+
+    bank = Bank(create=create)
+    results = run_refunds(bank, tmp_path / "journal", ["throttled", "bad"])
+
+    assert results["throttled"].status == JOURNAL_NOT_SENT
+    assert results["bad"].status == JOURNAL_SUBMIT_FAILED
+
+    bank.create = lambda trx_id: None
+    results = run_refunds(bank, tmp_path / "journal", ["throttled", "bad"])
+    # 429 можно отправить снова, отклонённый запрос — нет
+    assert sorted(bank.posted) == ["bad", "throttled", "throttled"]
+    assert results["throttled"].ok
+    assert results["bad"].status == JOURNAL_SUBMIT_FAILED
@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+from modules import TochkaAPI
+from response_cache import ResponseCache
+from token_manager import InMemoryTokenManager
+
+
+def legal_entity(status: str) -> dict:
+    return {
+        "status": status,
+        "createdAt": "2024-01-01T00:00:00+00:00",
+        "customerCode": "customer",
+        "legalId": "legal",
+        "countryCode": "RU",
+        "address": None,
+        "city": None,
+        "inn": "7700000000",
+        "kpp": None,
+        "name": "ООО Ромашка",
+        "ogrn": "1027700000000",
+    }
+
+
+def make_api(handler, **params) -> TochkaAPI:
+    api = TochkaAPI(
+        "client_id",
+        "client_secret",
+        token_manager=InMemoryTokenManager,
+        http_transport=httpx.MockTransport(handler),
+        **params,
+    )
+    tokens = api.token_manager.get_tokens("user", allow_create=True)
+    tokens.access = "access", 3600
+    api._customer_code = "user"
+    return api
+
+
+def test_cache_invalidated_by_mutation():
+    status = "Active"
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal status
+        requests.append(request.method)
+        if request.method == "POST":
+            status = "Suspended"
+            data = {"result": True}
+        else:
+            data = legal_entity(status)
+        return httpx.Response(200, json={"Data": data, "Links": {}, "Meta": {}})
+
+    async def main():
+        api = make_api(handler, response_cache=ResponseCache())
+        first = await api.sbp_get_legal_entity("legal")
+        cached = await api.sbp_get_legal_entity("legal")
+        await api.sbp_set_legal_entity_status("legal", False)
+        fresh = await api.sbp_get_legal_entity("legal")
+        await api.aclose()
+        return first, cached, fresh
+
+    first, cached, fresh = asyncio.run(main())
+    assert requests == ["GET", "POST", "GET"]
+    assert first.status == cached.status == "Active"
+    assert cached is not first
+    assert fresh.status == "Suspended"
+
+
+def test_cancelled_caller_does_not_cancel_shared_request():
+    requests = []
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        await release.wait()
+        data = legal_entity("Active")
+        return httpx.Response(200, json={"Data": data, "Links": {}, "Meta": {}})
+
+    async def main():
+        api = make_api(handler)
+        first = asyncio.create_task(api.sbp_get_legal_entity("legal"))
+        second = asyncio.create_task(api.sbp_get_legal_entity("legal"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        result = await second
+        await api.aclose()
+        return first, result
+
+    first, result = asyncio.run(main())
+    assert first.cancelled()
+    assert result.legal_id == "legal"
+    assert len(requests) == 1
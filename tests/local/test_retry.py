@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from exceptions import TochkaServerError
+from modules import TochkaAPI
+from retry import RetryBudget, RetryPolicy
+from token_manager import InMemoryTokenManager
+
+ACCOUNTS = {"Data": {"Account": []}, "Links": {}, "Meta": {}}
+LEGAL_ID = {"Data": {"legalId": "legal"}, "Links": {}, "Meta": {}}
+
+
+def make_api(handler, **params) -> TochkaAPI:
+    api = TochkaAPI(
+        "client_id",
+        "client_secret",
+        token_manager=InMemoryTokenManager,
+        http_transport=httpx.MockTransport(handler),
+        **params,
+    )
+    tokens = api.token_manager.get_tokens("user", allow_create=True)
+    tokens.access = "access", 3600
+    tokens.refresh = "refresh", 3600
+    api._customer_code = "user"
+    return api
+
+
+def run(api: TochkaAPI, call):
+    async def main():
+        try:
+            return await call(api)
+        finally:
+            await api.aclose()
+
+    return asyncio.run(main())
+
+
+def policy(**params) -> RetryPolicy:
+    return RetryPolicy(**{"base_delay": 0.001, "max_delay": 1} | params)
+
+
+def test_post_not_retried_after_send():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.method)
+        if len(requests) == 1:
+            raise httpx.ReadTimeout("response lost", request=request)
+        return httpx.Response(503, json={})
+
+    api = make_api(handler, retry_policy=policy())
+    with pytest.raises(httpx.ReadTimeout):
+        run(api, lambda api: api.sbp_register_legal_entity("customer"))
+    with pytest.raises(TochkaServerError):
+        run(api, lambda api: api.sbp_register_legal_entity("customer"))
+    assert requests == ["POST", "POST"]
+
+
+def test_post_retried_when_not_sent():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.method)
+        if len(requests) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json=LEGAL_ID)
+
+    api = make_api(handler, retry_policy=policy())
+    result = run(api, lambda api: api.sbp_register_legal_entity("customer"))
+    assert result.legal_id == "legal"
+    assert requests == ["POST", "POST"]
+
+
+def test_retry_after_respected():
+    sent_at = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent_at.append(time.monotonic())
+        if len(sent_at) == 1:
+            return httpx.Response(503, headers={"Retry-After": "0.2"}, json={})
+        return httpx.Response(200, json=ACCOUNTS)
+
+    api = make_api(handler, retry_policy=policy())
+    run(api, lambda api: api.get_accounts())
+    assert len(sent_at) == 2
+    assert sent_at[1] - sent_at[0] >= 0.2
+
+
+def test_retry_after_longer_than_max_delay_not_retried():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.method)
+        return httpx.Response(503, headers={"Retry-After": "30"}, json={})
+
+    api = make_api(handler, retry_policy=policy())
+    with pytest.raises(TochkaServerError):
+        run(api, lambda api: api.get_accounts())
+    assert requests == ["GET"]
+
+
+def test_retry_budget_limits_retries():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.method)
+        return httpx.Response(503, json={})
+
+    budget = RetryBudget(ratio=0, min_per_second=0, max_balance=2)
+    api = make_api(handler, retry_policy=policy(budget=budget))
+
+    async def call_three_times(api):
+        for _ in range(3):
+            with pytest.raises(TochkaServerError):
+                await api.get_accounts()
+
+    run(api, call_three_times)
+    # первый вызов тратит оба повтора бюджета, остальные не повторяются
+    assert len(requests) == 3 + 1 + 1
@@ -0,0 +1,74 @@
+import time
+from datetime import datetime, timezone
+
+import httpx
+import orjson
+from models.tokens import TokenField, Tokens
+
+
+def make_tokens(user_code: str, updates: list) -> Tokens:
+    return Tokens(user_code, lambda user_code, tokens: updates.append(user_code))
+
+
+def test_tokens_instances_are_independent():
+    updates = []
+    first = make_tokens("first", updates)
+    second = make_tokens("second", updates)
+
+    first.access = "first-access", 3600
+    first.refresh = "first-refresh", 3600
+    second.access = "second-access", 3600
+
+    assert first.access == "first-access"
+    assert first.refresh == "first-refresh"
+    assert second.access == "second-access"
+    assert second.refresh is None
+    assert updates == ["first", "first", "second"]
+
+
+def test_tokens_load_iso_expires():
+    # до хранения в unix time срок действия записывался строкой ISO 8601
+    data = orjson.loads(
+        orjson.dumps(
+            {
+                "client": {"value": None, "expires": None},
+                "access": {
+                    "value": "access",
+                    "expires": datetime(2030, 1, 1, tzinfo=timezone.utc),
+                },
+                "refresh": {"value": "refresh", "expires": "2000-01-01T00:00:00+00:00"},
+            }
+        )
+    )
+    tokens = make_tokens("user", [])
+    tokens.load("user", data)
+
+    assert tokens.client is None
+    assert tokens.access == "access"
+    assert tokens.access.expires == datetime(2030, 1, 1, tzinfo=timezone.utc)
+    assert tokens.access.is_alive
+    assert not tokens.refresh.is_alive
+
+    user_code, dumped = tokens.dump()
+    assert (
+        dumped["access"]["expires"]
+        == datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp()
+    )
+
+
+def test_token_field_replaces_str():
+    token = TokenField("secret", expires_in=3600)
+
+    assert token == "secret"
+    assert token == TokenField("secret")
+    assert token != "other"
+    assert {token: 1}["secret"] == 1
+    assert len(token) == 6
+    assert str(token) == "secret"
+    assert f"Bearer {token}" == "Bearer secret"
+    assert token.expires_at > time.time()
+
+    request = httpx.Request(
+        "POST", "https://enter.tochka.com/connect/token", data={"refresh_token": token}
+    )
+    assert request.read() == b"refresh_token=secret"
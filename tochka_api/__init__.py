@@ -1,2 +1,4 @@
+from client_pool import TochkaClientPool
+from deadline import deadline
 from modules import TochkaAPI
-from modules.base import context_user_code
+from modules.base import context_priority, context_user_code
@@ -0,0 +1,140 @@
+import time
+from collections import deque
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit
+
+from exceptions import TochkaCircuitOpenError
+from httpx import Response, TransportError
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+def endpoint_family(url: str, depth: int = 3) -> str:
+    """
+    Группа методов по первым ``depth`` сегментам пути:
+    ``/sbp/v1.0/qr-code/{qrc_id}/payment-status`` -> ``/sbp/v1.0/qr-code``
+    """
+    if url.startswith("https://"):
+        parts = urlsplit(url)
+        prefix, path = f"https://{parts.netloc}", parts.path
+    else:
+        prefix, path = "", url.split("?", 1)[0]
+    segments = [segment for segment in path.split("/") if segment][:depth]
+    return prefix + "/" + "/".join(segments)
+
+
+class Circuit:
+    __slots__ = ("state", "outcomes", "failures", "opened_at", "probes")
+
+    def __init__(self):
+        self.state: str = CIRCUIT_CLOSED
+        self.outcomes: deque[tuple[float, bool]] = deque()
+        self.failures: int = 0
+        self.opened_at: float = 0
+        self.probes: int = 0
+
+    def forget_before(self, moment: float) -> None:
+        while self.outcomes and self.outcomes[0][0] < moment:
+            _, failed = self.outcomes.popleft()
+            self.failures -= failed
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для групп методов API (см. ``endpoint_family``).
+
+    Если за последние ``window`` секунд доля неудачных запросов группы
+    (ответы 5xx и сетевые ошибки) достигла ``failure_rate`` при не менее чем
+    ``min_requests`` запросах, цепь размыкается: следующие ``open_timeout``
+    секунд запросы группы сразу завершаются ``TochkaCircuitOpenError``,
+    не дожидаясь таймаута. Затем до ``half_open_probes`` пробных запросов
+    проверяют группу: успех замыкает цепь, неудача размыкает её снова.
+
+    :param failure_rate: доля неудачных запросов для размыкания
+    :param min_requests: минимальное число запросов в окне для размыкания
+    :param window: окно подсчёта в секундах
+    :param open_timeout: время в разомкнутом состоянии до пробных запросов
+    :param half_open_probes: число одновременных пробных запросов
+    :param family_depth: число сегментов пути, определяющих группу
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_requests: int = 10,
+        window: float = 30,
+        open_timeout: float = 30,
+        half_open_probes: int = 1,
+        family_depth: int = 3,
+    ):
+        self.failure_rate: float = failure_rate
+        self.min_requests: int = min_requests
+        self.window: float = window
+        self.open_timeout: float = open_timeout
+        self.half_open_probes: int = half_open_probes
+        self.family_depth: int = family_depth
+        self._circuits: dict[str, Circuit] = {}
+
+    def state(self, family: str) -> str:
+        circuit = self._circuits.get(family)
+        return circuit.state if circuit is not None else CIRCUIT_CLOSED
+
+    def _acquire(self, family: str, circuit: Circuit, now: float) -> bool:
+        """
+        Разрешает запрос или выбрасывает ``TochkaCircuitOpenError``.
+        Возвращает ``True``, если запрос пробный
+        """
+        if circuit.state == CIRCUIT_CLOSED:
+            return False
+        if circuit.state == CIRCUIT_OPEN:
+            retry_after = circuit.opened_at + self.open_timeout - now
+            if retry_after > 0:
+                raise TochkaCircuitOpenError(family, retry_after)
+            circuit.state = CIRCUIT_HALF_OPEN
+        if circuit.probes >= self.half_open_probes:
+            raise TochkaCircuitOpenError(family, 0)
+        circuit.probes += 1
+        return True
+
+    def _record(self, circuit: Circuit, probe: bool, failed: bool) -> None:
+        now = time.monotonic()
+        if probe:
+            circuit.outcomes.clear()
+            circuit.failures = 0
+            if failed:
+                circuit.state, circuit.opened_at = CIRCUIT_OPEN, now
+            else:
+                circuit.state = CIRCUIT_CLOSED
+            return
+        if circuit.state != CIRCUIT_CLOSED:
+            return  # ответ на запрос, отправленный до размыкания
+
+        circuit.outcomes.append((now, failed))
+        circuit.failures += failed
+        circuit.forget_before(now - self.window)
+        total = len(circuit.outcomes)
+        if total >= self.min_requests and circuit.failures / total >= self.failure_rate:
+            circuit.state, circuit.opened_at = CIRCUIT_OPEN, now
+
+    async def call(self, send: Callable[[], Awaitable[Response]], url: str) -> Response:
+        family = endpoint_family(url, self.family_depth)
+        circuit = self._circuits.get(family)
+        if circuit is None:
+            circuit = self._circuits[family] = Circuit()
+
+        probe = self._acquire(family, circuit, time.monotonic())
+        failed = None
+        try:
+            response = await send()
+            failed = response.status_code // 100 == 5
+            return response
+        except TransportError:
+            failed = True
+            raise
+        finally:
+            if probe:
+                circuit.probes -= 1
+            if failed is not None:  # отмена запроса не влияет на состояние цепи
+                self._record(circuit, probe, failed)
@@ -0,0 +1,136 @@
+import asyncio
+from typing import Iterator, Type
+
+from concurrency import ConcurrencyLimiter
+from httpx import AsyncBaseTransport, AsyncClient, Limits
+from modules import TochkaAPI
+from refresh_scheduler import TokenRefreshScheduler
+from settings import (
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT,
+)
+
+
+class TochkaClientPool:
+    """
+    Несколько приложений Точки (разные client_id) в одном процессе.
+
+    Клиенты API, выданные пулом, используют один пул соединений ``AsyncClient``,
+    один планировщик фонового обновления токенов и общий лимит
+    ``max_concurrency`` одновременных HTTP-запросов. Для каждого клиента
+    ведётся учёт запросов в работе и в очереди (см. ``stats``).
+
+    :param max_concurrency: общий лимит одновременных HTTP-запросов
+    :param max_tenant_concurrency: лимит одновременных запросов одного клиента
+    :param refresher_params: параметры ``TokenRefreshScheduler``
+    """
+
+    def __init__(
+        self,
+        http_limits: Limits | None = None,
+        http2: bool = False,
+        http_transport: AsyncBaseTransport | None = None,
+        max_concurrency: int = HTTP_MAX_CONNECTIONS,
+        max_tenant_concurrency: int | None = None,
+        api_class: Type[TochkaAPI] = TochkaAPI,
+        **refresher_params,
+    ):
+        self.http_session: AsyncClient = AsyncClient(
+            limits=http_limits
+            or Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            http2=http2,
+            transport=http_transport,
+            timeout=HTTP_TIMEOUT,
+        )
+        self.max_tenant_concurrency: int | None = max_tenant_concurrency
+        self.api_class: Type[TochkaAPI] = api_class
+        self.token_refresher: TokenRefreshScheduler = TokenRefreshScheduler(
+            **refresher_params
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tenants: dict[str, TochkaAPI] = {}
+
+    def __getitem__(self, client_id: str) -> TochkaAPI:
+        return self._tenants[client_id]
+
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._tenants
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tenants)
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    def add(
+        self,
+        client_id: str,
+        client_secret: str,
+        *args,
+        max_in_flight: int | None = None,
+        **api_params,
+    ) -> TochkaAPI:
+        """
+        Создаёт клиента API приложения. Параметры, кроме ``max_in_flight``,
+        передаются в ``TochkaAPI``; пул соединений и лимит запросов задаёт пул
+        """
+        if client_id in self._tenants:
+            raise ValueError(f"client `{client_id}` is already in the pool")
+        api = self.api_class(
+            client_id,
+            client_secret,
+            *args,
+            http_client=self.http_session,
+            concurrency_limiter=ConcurrencyLimiter(
+                self._semaphore, max_in_flight or self.max_tenant_concurrency
+            ),
+            **api_params,
+        )
+        api.token_refresher = self.token_refresher
+        self.token_refresher.add(api)
+        self._tenants[client_id] = api
+        return api
+
+    async def remove(self, client_id: str) -> None:
+        api = self._tenants.pop(client_id)
+        await api.aclose()
+
+    def start_token_refresher(self) -> TokenRefreshScheduler:
+        self.token_refresher.start()
+        return self.token_refresher
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        HTTP-запросы каждого клиента: в работе, в очереди, завершённые, ошибки
+        """
+        return {
+            client_id: api.concurrency_limiter.stats()
+            for client_id, api in self._tenants.items()
+        }
+
+    async def open(self) -> None:
+        """
+        Загружает токены клиентов. Общий ``AsyncClient`` открывается
+        при первом запросе, поэтому ``open`` можно вызвать и после запросов
+        """
+        for api in self._tenants.values():
+            await api.open()
+
+    async def aclose(self) -> None:
+        await self.token_refresher.stop()
+        for api in self._tenants.values():
+            await api.aclose()
+        await self.http_session.aclose()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
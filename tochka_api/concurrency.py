@@ -0,0 +1,73 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from httpx import Response
+
+
+class ConcurrencyLimiter:
+    """
+    Ограничивает число одновременных HTTP-запросов клиента и ведёт их учёт.
+
+    Запрос ждёт слот сначала в собственном лимите клиента (``max_in_flight``),
+    затем в общем ``semaphore``, который может быть разделён между
+    несколькими клиентами (см. ``TochkaClientPool``).
+
+    :param semaphore: общий семафор нескольких клиентов
+    :param max_in_flight: лимит одновременных запросов этого клиента
+    """
+
+    def __init__(
+        self,
+        semaphore: asyncio.Semaphore | None = None,
+        max_in_flight: int | None = None,
+    ):
+        self.semaphore: asyncio.Semaphore | None = semaphore
+        self.max_in_flight: int | None = max_in_flight
+        self._semaphores: tuple[asyncio.Semaphore, ...] = tuple(
+            semaphore
+            for semaphore in (
+                asyncio.Semaphore(max_in_flight) if max_in_flight else None,
+                semaphore,
+            )
+            if semaphore is not None
+        )
+
+        self.in_flight: int = 0
+        self.waiting: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    async def call(self, send: Callable[[], Awaitable[Response]]) -> Response:
+        acquired = []
+        self.waiting += 1
+        try:
+            for semaphore in self._semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            response = await send()
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            for semaphore in acquired:
+                semaphore.release()
+        self.completed += 1
+        return response
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, TypeVar
+
+from exceptions import TochkaDeadlineExceededError
+
+T = TypeVar("T")
+
+context_deadline = ContextVar("context_deadline", default=None)
+context_timeout = ContextVar("context_timeout", default=None)
+
+
+def timeout(seconds: float):
+    """
+    Задаёт таймаут HTTP-запроса метода API вместо ``HTTP_TIMEOUT``.
+    Переопределяется параметром ``endpoint_timeouts`` клиента
+    """
+
+    def decorator(function):
+        function.timeout = seconds
+        return function
+
+    return decorator
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Ограничивает общее время запросов внутри блока, включая ожидание
+    обновления токенов, очереди ``RateLimiter`` и повторы ``RetryPolicy``.
+    Вложенный ``deadline`` не может продлить внешний.
+
+    По истечении срока выбрасывается ``TochkaDeadlineExceededError``
+    """
+    moment = time.monotonic() + seconds
+    current = context_deadline.get()
+    if current is not None:
+        moment = min(moment, current)
+    token = context_deadline.set(moment)
+    try:
+        yield
+    finally:
+        context_deadline.reset(token)
+
+
+def time_left() -> float | None:
+    """
+    Оставшееся до истечения ``deadline`` время в секундах, ``None`` без ``deadline``
+    """
+    moment = context_deadline.get()
+    if moment is None:
+        return None
+    return moment - time.monotonic()
+
+
+def request_timeout(default: float) -> float:
+    """
+    Таймаут очередного HTTP-запроса: таймаут метода, но не дольше ``deadline``
+    """
+    seconds = context_timeout.get()
+    if seconds is None:
+        seconds = default
+    left = time_left()
+    if left is None:
+        return seconds
+    if left <= 0:
+        raise TochkaDeadlineExceededError()
+    return min(seconds, left)
+
+
+async def within_deadline(awaitable: Awaitable[T]) -> T:
+    """
+    Ждёт ``awaitable`` не дольше оставшегося до ``deadline`` времени
+    """
+    left = time_left()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        elif isinstance(awaitable, asyncio.Future):
+            awaitable.cancel()
+        raise TochkaDeadlineExceededError()
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        raise TochkaDeadlineExceededError() from None
+
+
+async def without_deadline(awaitable: Awaitable[T]) -> T:
+    """
+    Выполняет общую для нескольких вызывающих задачу без ``deadline`` первого
+    из них; каждый вызывающий ждёт её в пределах своего ``deadline``.
+    Вызывается внутри отдельной задачи, поэтому не меняет контекст вызывающего
+    """
+    context_deadline.set(None)
+    return await awaitable
@@ -1 +1,8 @@
-from .base import TochkaError, TochkaUnauthorizedError
+from .base import (
+    TochkaCircuitOpenError,
+    TochkaClientError,
+    TochkaDeadlineExceededError,
+    TochkaError,
+    TochkaServerError,
+    TochkaUnauthorizedError,
+)
@@ -29,3 +29,40 @@ class TochkaUnauthorizedError(TochkaError):
 
 class TochkaServerError(TochkaError):
     ...
+
+
+class TochkaClientError(TochkaError):
+    """
+    Запрос прерван на стороне клиента, ответа API нет
+    """
+
+    def __new__(cls, *args, **kwargs):
+        return super(TochkaError, cls).__new__(cls, *args)
+
+    def __init__(self, text: str, *args, **kwargs):
+        self.status_code = None
+        self.text = text
+        self.response = None
+        super(TochkaError, self).__init__(text, *args)
+
+
+class TochkaCircuitOpenError(TochkaClientError):
+    """
+    Запрос не отправлен: для группы методов разомкнут ``CircuitBreaker``
+    """
+
+    def __init__(self, family: str, retry_after: float, *args, **kwargs):
+        self.family = family
+        self.retry_after = retry_after
+        super().__init__(
+            f"circuit for {family} is open, retry in {retry_after:.1f}s", *args
+        )
+
+
+class TochkaDeadlineExceededError(TochkaClientError):
+    """
+    Истёк срок, отведённый на запрос через ``deadline``
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__("request deadline exceeded", *args)
@@ -0,0 +1,48 @@
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import Any
+
+import orjson as orjson
+import ujson as ujson
+
+
+class JsonCodec(ABC):
+    """
+    Сериализация тел запросов и разбор ответов API
+    """
+
+    content_type: str = "application/json"
+
+    @abstractmethod
+    def loads(self, data: bytes | str) -> Any:
+        ...
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        ...
+
+
+def _orjson_default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    Разбирает ответ сразу из байтов, без промежуточного декодирования в ``str``
+    """
+
+    def loads(self, data: bytes | str) -> Any:
+        return orjson.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_orjson_default)
+
+
+class UjsonCodec(JsonCodec):
+    def loads(self, data: bytes | str) -> Any:
+        return ujson.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return ujson.dumps(obj).encode()
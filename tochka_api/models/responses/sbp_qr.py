@@ -53,7 +53,34 @@ class SbpQrsResponse(TochkaBaseResponse):
 class SbpRegisterQrResponse(TochkaBaseResponse):
     qrc_id: str = Field(..., alias="qrcId")
     payload: str
-    image: SbpQrCodeImage
+    image: SbpQrCodeImage | None  # None, если QR зарегистрирован без изображения
+
+
+class SbpQrRegistration(BaseModel):
+    """
+    Результат регистрации одного QR кода в sbp_register_qrs
+    """
+
+    index: int
+    params: dict
+    response: SbpRegisterQrResponse | None = None
+    error: BaseException | None = None
+    elapsed: float  # in seconds
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class SbpQrRegistrationStats(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    elapsed: float  # in seconds
+    per_second: float
 
 
 class SbpQrPaymentDataResponse(TochkaBaseResponse):
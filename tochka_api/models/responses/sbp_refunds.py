@@ -1,3 +1,4 @@
+from datetime import date
 from typing import Literal
 
 from models.responses import TochkaBaseResponse
@@ -25,6 +26,18 @@ class SbpPaymentsResponse(TochkaBaseResponse):
     payments: list[Payment] = Field(..., alias="Payments")
 
 
+class SbpPaymentsWindow(BaseModel):
+    from_date: date
+    to_date: date
+    payments_count: int
+    elapsed: float  # in seconds
+
+
+class SbpPaymentsWindowsResult(BaseModel):
+    payments: list[Payment]
+    windows: list[SbpPaymentsWindow]
+
+
 class SbpRefundResponse(TochkaBaseResponse):
     request_id: str = Field(..., alias="requestId")
     status: Literal[
@@ -36,3 +49,23 @@ class SbpRefundResponse(TochkaBaseResponse):
         "Rejected",
     ]
     description: str | None = Field(None, alias="statusDescription")
+
+
+class SbpBulkRefundResult(BaseModel):
+    """
+    Итог одного возврата в sbp_start_refunds
+    """
+
+    trx_id: str
+    request_id: str | None = None
+    status: str | None = None  # статус возврата или журнала SbpBulkRefund
+    response: SbpRefundResponse | None = None
+    error: BaseException | None = None
+    resumed: bool = False  # возврат был отправлен в прошлом запуске
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status == "Accepted"
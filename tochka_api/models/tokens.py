@@ -1,63 +1,116 @@
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import datetime, timezone
 from typing import Callable
 
 import dateutil.parser
 
-from settings import HTTP_TIMEOUT
+from settings import TOKEN_EXPIRY_MARGIN
 
 
-class TokenField(str):
-    def __new__(cls, *args, **kwargs):
-        return super().__new__(cls, args[0])
+class TokenField:
+    """
+    Значение токена и момент истечения срока его действия (unix time).
+
+    Не является подклассом ``str``, чтобы хранить срок действия в слоте,
+    а не в ``__dict__``; в строку приводится через ``str(token)``,
+    сравнивается и с ``TokenField``, и со ``str``.
+    """
+
+    __slots__ = ("value", "expires_at")
 
     def __init__(
-        self, value, *, expires_in: int | None = None, expires: datetime | None = None
+        self,
+        value: str,
+        *,
+        expires_in: int | None = None,
+        expires: datetime | float | None = None,
     ):
+        self.value: str = str(value)
         if expires is not None:
-            self._expires = expires
+            self.expires_at: float | None = (
+                expires.timestamp() if isinstance(expires, datetime) else expires
+            )
         elif expires_in is None:
-            self._expires = None
+            self.expires_at = None
         else:
-            self._expires = datetime.now(timezone.utc) + timedelta(
-                seconds=expires_in - HTTP_TIMEOUT
-            )
+            self.expires_at = time.time() + expires_in - TOKEN_EXPIRY_MARGIN
+
+    def __str__(self) -> str:
+        return self.value
+
+    def __repr__(self) -> str:
+        return f"TokenField({self.value!r}, expires_at={self.expires_at!r})"
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self.value, format_spec)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TokenField):
+            return self.value == other.value
+        if isinstance(other, str):
+            return self.value == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+    def __len__(self) -> int:
+        return len(self.value)
 
     @property
     def expires(self) -> datetime | None:
-        return self._expires
+        if self.expires_at is None:
+            return None
+        return datetime.fromtimestamp(self.expires_at, timezone.utc)
 
     @property
     def is_alive(self) -> bool:
-        if self._expires is None:
-            return True
-        return datetime.now(timezone.utc) < self.expires
+        return self.expires_at is None or time.time() < self.expires_at
 
 
 class TokenDescriptor:
-    def __init__(self):
-        self.value = None
+    """
+    Поле ``Tokens``: хранит ``TokenField`` в слоте экземпляра
+    и сообщает token manager об изменении
+    """
+
+    def __set_name__(self, owner, name: str):
+        self.slot = getattr(owner, f"_{name}")
 
     def __get__(self, instance, owner) -> TokenField | None:
-        return self.value
+        if instance is None:
+            return self
+        return self.slot.__get__(instance, owner)
 
     def __set__(
-        self, instance, value: tuple[str, int | datetime | None, datetime | None] | str
+        self,
+        instance,
+        value: (
+            tuple[str, int | datetime | float | None, datetime | float | None]
+            | str
+            | None
+        ),
     ):
-        if type(value) is str:
-            value = (value, None, None)
-        elif len(value) == 1:
-            value = value + (None, None)
-        elif isinstance(value[1], datetime):
-            value = (value[0], None, value[1])
-        elif len(value) == 2:
-            value = value + (None,)
-        self.value = TokenField(value[0], expires_in=value[1], expires=value[2])
+        if value is None:
+            self.slot.__set__(instance, None)
+        else:
+            if type(value) is str:
+                value = (value, None, None)
+            elif len(value) == 1:
+                value = value + (None, None)
+            elif isinstance(value[1], datetime):
+                value = (value[0], None, value[1])
+            elif len(value) == 2:
+                value = value + (None,)
+            self.slot.__set__(
+                instance, TokenField(value[0], expires_in=value[1], expires=value[2])
+            )
 
         instance.on_update(instance.user_code, instance)
 
 
 class Tokens:
-    __slots__ = ("on_update", "user_code")
+    __slots__ = ("on_update", "user_code", "_client", "_access", "_refresh")
     token_fields = ("client", "access", "refresh")
     client: TokenField | None = TokenDescriptor()
     access: TokenField | None = TokenDescriptor()
@@ -66,27 +119,28 @@ class Tokens:
     def __init__(self, user_code, on_update: Callable[[str, dict], None]):
         self.on_update = on_update
         self.user_code = user_code
-        # self.client: TokenField | None = TokenDescriptor()
-        # self.access: TokenField | None = TokenDescriptor()
-        # self.refresh: TokenField | None = TokenDescriptor()
+        self._client: TokenField | None = None
+        self._access: TokenField | None = None
+        self._refresh: TokenField | None = None
 
     def dump(self) -> tuple[str, dict]:
         data = {}
 
         for field_name in self.token_fields:
-            if field_name[0] == "_":
-                continue
-
-            field = getattr(self, field_name, None)
+            field = getattr(self, field_name)
 
             data[field_name] = {
-                "value": field,
-                "expires": field.expires if field else None,
+                "value": field.value if field is not None else None,
+                "expires": field.expires_at if field is not None else None,
             }
 
         return self.user_code, data
 
-    def load(self, user_code: str, data: dict[str, dict[str, str | datetime | None]]):
+    def load(
+        self,
+        user_code: str,
+        data: dict[str, dict[str, str | float | datetime | None]],
+    ):
         self.user_code = user_code
         if not all(field in data for field in self.token_fields):
             raise ValueError("data does not contain all fields")
@@ -95,6 +149,8 @@ class Tokens:
             field_data = data.get(field_name)
             value = field_data.get("value")
             expires = field_data.get("expires")
-            if isinstance(expires, str):
+            if isinstance(expires, str):  # формат до хранения в unix time
                 expires = dateutil.parser.parse(expires)
-            setattr(self, field_name, (value, None, expires))
+            setattr(
+                self, field_name, (value, None, expires) if value is not None else None
+            )
@@ -1,14 +1,17 @@
 from models.responses.accounts import AccountsResponse
 from modules import TochkaApiBase
+from response_cache import cacheable
 
 
 class TochkaApiAccounts(TochkaApiBase):
+    @cacheable
     async def get_accounts(self, user_code: str | None = None) -> AccountsResponse:
         return await self.request(
             method="GET",
             url="/open-banking/v1.0/accounts",
         )
 
+    @cacheable
     async def get_account(
         self, account: str, user_code: str | None = None
     ) -> AccountsResponse:
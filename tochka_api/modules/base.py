@@ -1,4 +1,7 @@
+import asyncio
+import functools
 import inspect
+import time
 import urllib.parse
 from contextvars import ContextVar
 from datetime import datetime, timedelta
@@ -6,64 +9,219 @@ from types import GenericAlias
 from typing import Literal, Type
 
 import jwt
-import ujson as ujson
+from circuit_breaker import CircuitBreaker
+from concurrency import ConcurrencyLimiter
+from deadline import (
+    context_timeout,
+    request_timeout,
+    time_left,
+    within_deadline,
+    without_deadline,
+)
 from exceptions.base import TochkaError
-from httpx import AsyncClient, Response
+from httpx import (
+    AsyncBaseTransport,
+    AsyncClient,
+    ConnectError,
+    ConnectTimeout,
+    Limits,
+    Response,
+    TransportError,
+)
+from json_codecs import JsonCodec, OrjsonCodec
 from models import PermissionsEnum, Tokens
 from models.responses import ConsentsResponse, TochkaBaseResponse
-from settings import HTTP_TIMEOUT, TOCHKA_BASE_API_URL
+from rate_limiter import PRIORITY_DEFAULT, RateLimiter
+from refresh_scheduler import TokenRefreshScheduler
+from response_cache import ResponseCache
+from retry import RetryPolicy
+from settings import (
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT,
+    TOCHKA_BASE_API_URL,
+)
 from token_manager import (
     AbstractTokenManager,
     LocalStorageTokenManager,
 )
 
 context_user_code = ContextVar("context_user_code")
+context_endpoint = ContextVar("context_endpoint", default=None)
+context_priority = ContextVar("context_priority", default=PRIORITY_DEFAULT)
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_token_claims(token: str) -> dict | None:
+    """
+    Claims JWT без проверки подписи; результат кэшируется по токену
+    """
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+class TochkaEndpoint:
+    """
+    Скомпилированное описание метода API, вычисляется один раз при создании класса
+    """
+
+    __slots__ = (
+        "name",
+        "function",
+        "response_model",
+        "valid_status_code",
+        "accepts_user_code",
+        "cacheable",
+        "invalidates",
+        "idempotent",
+        "priority",
+        "timeout",
+    )
+
+    def __init__(self, name: str, function, response_model: Type[TochkaBaseResponse]):
+        self.name: str = name
+        self.function = function
+        self.response_model: Type[TochkaBaseResponse] = response_model
+        self.valid_status_code: int = response_model._valid_status_code
+        self.accepts_user_code: bool = (
+            "user_code" in inspect.signature(function).parameters
+        )
+        self.cacheable: bool = getattr(function, "cacheable", False)
+        self.invalidates: tuple[str, ...] = getattr(function, "invalidates", ())
+        self.idempotent: bool | None = getattr(function, "idempotent", None)
+        self.priority: int | None = getattr(function, "priority", None)
+        self.timeout: float | None = getattr(function, "timeout", None)
+
+    @staticmethod
+    def is_response_model(annotation) -> bool:
+        return (
+            isinstance(annotation, type)
+            and not isinstance(annotation, GenericAlias)
+            and issubclass(annotation, TochkaBaseResponse)
+        )
 
+    async def call_with_retries(
+        self, retry_policy: RetryPolicy, f_args: tuple, f_kwargs: dict
+    ) -> Response:
+        retry_policy.on_request()
+        attempt = 1
+        while True:
+            error = None
+            try:
+                response: Response = await self.function(*f_args, **f_kwargs)
+            except TransportError as transport_error:
+                error = transport_error
+                method = error.request.method
+                sent = not isinstance(error, (ConnectError, ConnectTimeout))
+            else:
+                if response.status_code not in retry_policy.retry_statuses:
+                    return response
+                method, sent = response.request.method, True
 
-class TochkaAPIMeta:
-    def __new__(cls, *args, **kwargs):
-        for name, function in inspect.getmembers(cls, predicate=inspect.isfunction):
-            if name.startswith("__"):
-                continue
+            delay = retry_policy.retry_delay(
+                attempt, response if error is None else None
+            )
+            left = time_left()
             if (
-                "return" in function.__annotations__
-                and isinstance(function.__annotations__["return"], type)
-                and not isinstance(function.__annotations__["return"], GenericAlias)
-                and issubclass(function.__annotations__["return"], TochkaBaseResponse)
+                delay is None
+                or (left is not None and left <= delay)
+                or not retry_policy.should_retry(attempt, method, self.idempotent, sent)
             ):
+                if error is not None:
+                    raise error
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def compile(self):
+        function = self.function
+        response_model = self.response_model
+        valid_status_code = self.valid_status_code
+        accepts_user_code = self.accepts_user_code
+        cacheable = self.cacheable
+        invalidates = self.invalidates
+        priority = self.priority
+        name = self.name
+        default_timeout = self.timeout
+        endpoint = self
+
+        @functools.wraps(function)
+        async def decorated(*f_args, **f_kwargs):
+            api: TochkaApiBase = f_args[0]
+            token = None
+            if f_kwargs.get("user_code") is not None:
+                token = context_user_code.set(f_kwargs["user_code"])
+            if not accepts_user_code:
+                f_kwargs.pop("user_code", None)
+            endpoint_token = None
+            if cacheable and api.response_cache is not None:
+                endpoint_token = context_endpoint.set(endpoint)
+            priority_token = None
+            # приоритет, явно заданный вызывающим, важнее приоритета метода
+            if (
+                priority is not None
+                and api.rate_limiter is not None
+                and context_priority.get() == PRIORITY_DEFAULT
+            ):
+                priority_token = context_priority.set(priority)
+            endpoint_timeout = api.endpoint_timeouts.get(name, default_timeout)
+            timeout_token = None
+            if endpoint_timeout is not None:
+                timeout_token = context_timeout.set(endpoint_timeout)
+            try:
+                if api.retry_policy is None:
+                    response: Response = await function(*f_args, **f_kwargs)
+                else:
+                    response: Response = await endpoint.call_with_retries(
+                        api.retry_policy, f_args, f_kwargs
+                    )
+                if invalidates and api.response_cache is not None:
+                    api.response_cache.invalidate(api._current_user_code(), invalidates)
+            finally:
+                if endpoint_token is not None:
+                    context_endpoint.reset(endpoint_token)
+                if priority_token is not None:
+                    context_priority.reset(priority_token)
+                if timeout_token is not None:
+                    context_timeout.reset(timeout_token)
+                if token is not None:
+                    context_user_code.reset(token)
+
+            if response.status_code != valid_status_code:
+                raise TochkaError(response)
+            # ответ из кэша или объединённого запроса общий для всех вызывающих,
+            # поэтому каждый получает свою модель, разобранную из тела ответа
+            return response_model(**api.json_codec.loads(response.content))
+
+        decorated.endpoint = self
+        return decorated
+
+
+class TochkaAPIMeta(type):
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        endpoints: dict[str, TochkaEndpoint] = {}
+        for base in reversed(bases):
+            endpoints |= getattr(base, "_endpoints", {})
+
+        for attr_name, function in list(namespace.items()):
+            if attr_name.startswith("__") or not inspect.isfunction(function):
+                continue
+            response_model = function.__annotations__.get("return")
+            if not TochkaEndpoint.is_response_model(response_model):
+                continue
+            endpoint = TochkaEndpoint(attr_name, function, response_model)
+            endpoints[attr_name] = endpoint
+            namespace[attr_name] = endpoint.compile()
+
+        namespace["_endpoints"] = endpoints
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
 
-                def decorate(f):
-                    async def decorated(*f_args, **f_kwargs):
-                        token = None
-                        if f_kwargs.get("user_code") is not None:
-                            token = context_user_code.set(f_kwargs.get("user_code"))
-                        if (
-                            "user_code" not in inspect.getfullargspec(f).args
-                            and "user_code" in f_kwargs
-                        ):
-                            del f_kwargs["user_code"]
-                        response: Response = await f(*f_args, **f_kwargs)
-
-                        if token is not None:
-                            context_user_code.reset(token)
-                        if (
-                            response.status_code
-                            == f.__annotations__["return"]._valid_status_code
-                        ):
-                            return f.__annotations__["return"](
-                                **ujson.loads(response.text)
-                            )
-                        else:
-                            raise TochkaError(response)
-
-                    return decorated
-
-                setattr(cls, name, decorate(function))
-
-        return super(TochkaAPIMeta, cls).__new__(cls)
-
-
-class TochkaApiBase(TochkaAPIMeta):
+
+class TochkaApiBase(metaclass=TochkaAPIMeta):
     def __init__(
         self,
         client_id: str,
@@ -73,6 +231,19 @@ class TochkaApiBase(TochkaAPIMeta):
         token_manager: Type[AbstractTokenManager] = LocalStorageTokenManager,
         one_customer_mode: bool = True,
         *args,
+        http_limits: Limits | None = None,
+        http2: bool = False,
+        http_transport: AsyncBaseTransport | None = None,
+        json_codec: JsonCodec | None = None,
+        response_cache: ResponseCache | None = None,
+        coalesce_requests: bool = True,
+        async_token_loading: bool = False,
+        retry_policy: RetryPolicy | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        endpoint_timeouts: dict[str, float] | None = None,
+        http_client: AsyncClient | None = None,
+        concurrency_limiter: ConcurrencyLimiter | None = None,
         **token_manager_data,
     ):
         self.__client_id: str = client_id
@@ -83,20 +254,85 @@ class TochkaApiBase(TochkaAPIMeta):
         self.token_manager: AbstractTokenManager = token_manager(
             self.__client_id, **token_manager_data
         )
-        self.token_manager.load_tokens()
         self.one_customer_mode: bool = one_customer_mode
         self._user_code: str | None = None
-        if self.one_customer_mode and len(self.token_manager.tokens_mapper) == 1:
-            self._customer_code = list(self.token_manager.tokens_mapper.keys())[0]
-
-        self._http_session: AsyncClient = None
+        self._tokens_loaded: bool = False
+        if not async_token_loading:
+            self.token_manager.load_tokens()
+            self._on_tokens_loaded()
+
+        self._http_limits: Limits = http_limits or Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        self._http2: bool = http2
+        self._http_transport: AsyncBaseTransport | None = http_transport
+        # общий http_client (например, из TochkaClientPool) клиент не закрывает
+        self._http_session: AsyncClient = http_client
+        self._owns_http_session: bool = http_client is None
+        self.concurrency_limiter: ConcurrencyLimiter | None = concurrency_limiter
+        self.json_codec: JsonCodec = json_codec or OrjsonCodec()
+        self.response_cache: ResponseCache | None = response_cache
+        self.coalesce_requests: bool = coalesce_requests
+        self.retry_policy: RetryPolicy | None = retry_policy
+        self.rate_limiter: RateLimiter | None = rate_limiter
+        self.circuit_breaker: CircuitBreaker | None = circuit_breaker
+        self.endpoint_timeouts: dict[str, float] = endpoint_timeouts or {}
+        self._inflight_requests: dict[tuple, asyncio.Future] = {}
+        self._refresh_futures: dict[str, asyncio.Future] = {}
+        self.token_refresher: TokenRefreshScheduler | None = None
 
     @property
     def http_session(self, user_code: str | None = None) -> AsyncClient:
         if self._http_session is None:
-            self._http_session = AsyncClient()
+            self._http_session = AsyncClient(
+                limits=self._http_limits,
+                http2=self._http2,
+                transport=self._http_transport,
+                timeout=HTTP_TIMEOUT,
+            )
         return self._http_session
 
+    def _on_tokens_loaded(self) -> None:
+        self._tokens_loaded = True
+        if self.one_customer_mode and len(self.token_manager.tokens_mapper) == 1:
+            self._customer_code = list(self.token_manager.tokens_mapper.keys())[0]
+
+    async def open(self) -> None:
+        """
+        Создаёт пул соединений заранее, до первого запроса.
+        С ``async_token_loading=True`` здесь же загружаются токены,
+        не блокируя event loop
+        """
+        if not self._tokens_loaded:
+            await self.token_manager.aload_tokens()
+            self._on_tokens_loaded()
+        # клиент, созданный раньше при первом запросе, httpx уже открыл сам
+        if self._owns_http_session and self._http_session is None:
+            await self.http_session.__aenter__()
+
+    async def aclose(self) -> None:
+        """
+        Останавливает фоновое обновление токенов, сохраняет отложенные изменения
+        токенов и закрывает пул соединений
+        """
+        await self.stop_token_refresher()
+        # начатое обновление не отменяется: новый refresh-токен уже мог быть выдан,
+        # поэтому его дожидаются до закрытия token_manager и пула соединений
+        await asyncio.gather(*self._refresh_futures.values(), return_exceptions=True)
+        await self.token_manager.aclose()
+        if self._http_session is not None and self._owns_http_session:
+            await self._http_session.aclose()
+            self._http_session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
     async def request(
         self,
         method: Literal["GET", "POST", "PUT", "DELETE"] = "GET",
@@ -110,34 +346,252 @@ class TochkaApiBase(TochkaAPIMeta):
         auth_required: bool = True,
         **get_tokens_params,
     ) -> Response:
+        user_code = None
+        if auth_required:
+            user_code = (
+                self._customer_code
+                if self.one_customer_mode
+                else context_user_code.get()
+            )
+        return await self._request(
+            user_code,
+            None,
+            method=method,
+            url=url,
+            headers=headers,
+            json=json,
+            data=data,
+            params=params,
+            cookies=cookies,
+            content=content,
+            auth_required=auth_required,
+            **get_tokens_params,
+        )
+
+    async def _request(
+        self,
+        user_code: str | None,
+        tokens: Tokens | None,
+        method: str,
+        url: str,
+        headers: dict | None,
+        json: dict | None,
+        data: dict | None,
+        params: dict | None,
+        cookies: dict | None,
+        content: bytes | None,
+        auth_required: bool,
+        **get_tokens_params,
+    ) -> Response:
+        """
+        ``request`` для уже известного пользователя; ``tokens``, если переданы,
+        используются вместо поиска в token_manager
+        """
         if json is not None:
-            content = ujson.encode(json)
-            headers = (headers or {}) | {"Content-Type": "application/json"}
+            content = self.json_codec.dumps(json)
+            headers = (headers or {}) | {"Content-Type": self.json_codec.content_type}
+        cache_key = None
         if auth_required:
-            if self.one_customer_mode:
-                get_tokens_params = get_tokens_params | {
-                    "user_code": self._customer_code
-                }
-            else:
-                get_tokens_params = get_tokens_params | {
-                    "user_code": context_user_code.get()
-                }
-            tokens = self.token_manager.get_tokens(**get_tokens_params)
+            get_tokens_params = get_tokens_params | {"user_code": user_code}
+
+            endpoint: TochkaEndpoint | None = context_endpoint.get()
+            if endpoint is not None and self.response_cache is not None:
+                cache_key = self.response_cache.make_key(user_code, method, url, params)
+                cached_response = self.response_cache.get(cache_key)
+                if cached_response is not None:
+                    return cached_response
+
+        send = functools.partial(
+            self._send,
+            method=method,
+            url=url,
+            headers=headers,
+            data=data,
+            params=params,
+            cookies=cookies,
+            content=content,
+            auth_required=auth_required,
+            tokens=tokens,
+            **get_tokens_params,
+        )
+        if self.rate_limiter is not None:
+            send = functools.partial(
+                self.rate_limiter.call, send, user_code, url, context_priority.get()
+            )
+        if self.circuit_breaker is not None:
+            # при разомкнутой цепи запрос не ждёт очереди rate_limiter
+            send = functools.partial(self.circuit_breaker.call, send, url)
+        if method == "GET" and self.coalesce_requests:
+            # запросы с разными заголовками (например, Authorization при
+            # auth_required=False), cookies или телом не объединяются
+            coalesce_key = (
+                ResponseCache.make_key(user_code, method, url, params),
+                ResponseCache.freeze(headers),
+                ResponseCache.freeze(cookies),
+                ResponseCache.freeze(data),
+                content,
+            )
+            response = await self._send_coalesced(coalesce_key, send)
+        else:
+            response = await send()
+
+        if cache_key is not None and response.status_code == endpoint.valid_status_code:
+            self.response_cache.set(cache_key, user_code, endpoint.name, response)
+        return response
+
+    async def _send_coalesced(self, key, send) -> Response:
+        """
+        Одинаковые GET-запросы, выполняющиеся одновременно, разделяют один
+        HTTP-запрос и один ответ. После завершения ответ нигде не хранится.
+        """
+        future = self._inflight_requests.get(key)
+        if future is None:
+            future = asyncio.ensure_future(without_deadline(send()))
+            self._inflight_requests[key] = future
+
+            def forget(done: asyncio.Future):
+                if self._inflight_requests.get(key) is done:
+                    del self._inflight_requests[key]
+
+            future.add_done_callback(forget)
+        return await within_deadline(asyncio.shield(future))
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None,
+        data: dict | None,
+        params: dict | None,
+        cookies: dict | None,
+        content: bytes | None,
+        auth_required: bool,
+        tokens: Tokens | None = None,
+        **get_tokens_params,
+    ) -> Response:
+        if auth_required:
+            if tokens is None:
+                tokens = await self.token_manager.aget_tokens(**get_tokens_params)
             if tokens.access is not None and not tokens.access.is_alive:
-                await self.refresh_tokens(**get_tokens_params)
+                await self._refresh_tokens_single_flight(**get_tokens_params)
             elif tokens.access is None:
                 raise ValueError("access_token is needed for authorization")
             headers = (headers or {}) | {"Authorization": f"Bearer {tokens.access}"}
-        return await self.http_session.request(
+        send = functools.partial(
+            self.http_session.request,
             method=method,
             url=url if url.startswith("https://") else self._base_url + url,
             data=data,
             headers=headers,
             params=params,
             cookies=cookies,
-            timeout=HTTP_TIMEOUT,
+            timeout=request_timeout(HTTP_TIMEOUT),
             content=content,
         )
+        # слот занимает только HTTP-запрос: обновление токенов выше само
+        # проходит через request() и не должно ждать слот, пока держит свой
+        if self.concurrency_limiter is not None:
+            send = functools.partial(self.concurrency_limiter.call, send)
+        # таймаут httpx ограничивает каждую фазу запроса, а не запрос целиком
+        return await within_deadline(send())
+
+    def _current_user_code(self) -> str | None:
+        if self.one_customer_mode:
+            return getattr(self, "_customer_code", None)
+        return context_user_code.get(None)
+
+    async def _refresh_tokens_single_flight(
+        self, user_code: str, **get_tokens_params
+    ) -> tuple[str, str, int]:
+        """
+        Обновляет токены пользователя не более одного раза одновременно:
+        первый вызов запускает обновление, остальные ждут его же результат
+        """
+        future = self._refresh_futures.get(user_code)
+        if future is None:
+            future = asyncio.ensure_future(
+                without_deadline(
+                    self._refresh_tokens_under_lease(user_code, **get_tokens_params)
+                )
+            )
+            self._refresh_futures[user_code] = future
+            future.add_done_callback(
+                lambda _: self._refresh_futures.pop(user_code, None)
+            )
+        return await within_deadline(asyncio.shield(future))
+
+    async def _refresh_tokens_under_lease(
+        self, user_code: str, **get_tokens_params
+    ) -> tuple[str, str, int]:
+        """
+        Обновляет токены под межпроцессной блокировкой token_manager.
+        Если, пока ждали блокировку, токены обновил другой процесс и его
+        access-токен ещё действует, повторно не обновляет, а берёт его результат
+        """
+        # выполняется отдельной задачей: таймаут метода, вызвавшего обновление,
+        # к запросу токенов не относится
+        context_timeout.set(None)
+        stale_refresh_token = (
+            await self.token_manager.aget_tokens(user_code, **get_tokens_params)
+        ).refresh
+        async with self.token_manager.refresh_lease(user_code):
+            tokens = await self.token_manager.areload_tokens(user_code)
+            if (
+                tokens.refresh is not None
+                and tokens.refresh != stale_refresh_token
+                and tokens.access is not None
+                and tokens.access.is_alive
+            ):
+                return (
+                    str(tokens.access),
+                    str(tokens.refresh),
+                    int(tokens.access.expires_at - time.time()),
+                )
+            # refresh_tokens берёт refresh-токен из только что перечитанных токенов
+            result = await self.refresh_tokens(
+                customer_code=user_code, **get_tokens_params
+            )
+            await self.token_manager.aflush()
+            return result
+
+    def for_customer(self, user_code: str) -> "TochkaCustomer":
+        """
+        Клиент, привязанный к пользователю ``user_code``: его методы API
+        не используют ``context_user_code`` и не ищут токены в token_manager
+        на каждом вызове. Создаётся дёшево, подходит для обхода тысяч
+        пользователей::
+
+            for user_code in user_codes:
+                await api.for_customer(user_code).sbp_get_qrs(legal_id)
+
+        Токены загружаются через ``aget_tokens`` при первом запросе, поэтому
+        ``for_customer`` не читает хранилище в event loop.
+        """
+        return customer_class(type(self))(self, user_code)
+
+    def start_token_refresher(self, **scheduler_params) -> TokenRefreshScheduler:
+        """
+        Запускает фоновое обновление токенов пользователей, загруженных
+        token_manager, незадолго до истечения их срока действия, чтобы
+        обновление не попадало на запросы.
+
+        Параметры передаются в ``TokenRefreshScheduler``:
+        ``lead_time``, ``jitter``, ``retry_interval``, ``rescan_interval``,
+        ``max_concurrency``.
+        """
+        if self.token_refresher is None:
+            self.token_refresher = TokenRefreshScheduler(self, **scheduler_params)
+        else:
+            self.token_refresher.add(self)
+        self.token_refresher.start()
+        return self.token_refresher
+
+    async def stop_token_refresher(self) -> None:
+        if self.token_refresher is not None:
+            # общий планировщик останавливается вместе с последним клиентом
+            self.token_refresher.remove(self)
+            if not self.token_refresher.apis:
+                await self.token_refresher.stop()
 
     async def get_consents_token(self) -> tuple[str, datetime]:
         data = {
@@ -157,7 +611,7 @@ class TochkaApiBase(TochkaAPIMeta):
         )
 
         if response.status_code == 200:
-            response_data = ujson.loads(response.text)
+            response_data = self.json_codec.loads(response.content)
             return response_data["access_token"], response_data["expires_in"]
 
         # TODO: Exception on error response
@@ -250,15 +704,18 @@ class TochkaApiBase(TochkaAPIMeta):
         )
 
         if response.status_code == 200:
-            response_data = ujson.loads(response.text)
+            response_data = self.json_codec.loads(response.content)
             if self.one_customer_mode:
                 self._customer_code = customer_code
-            tokens = self.token_manager.get_tokens(
+            tokens = await self.token_manager.aget_tokens(
                 customer_code, allow_create=True, **get_tokens_params
             )
             tokens.access = response_data["access_token"], response_data["expires_in"]
             tokens.refresh = response_data["refresh_token"], timedelta(days=30).seconds
 
+            if self.token_refresher is not None and self.token_refresher.is_running:
+                self.token_refresher.schedule(customer_code, api=self)
+
             return tokens
 
         # TODO: сделать обработку исключений
@@ -268,12 +725,12 @@ class TochkaApiBase(TochkaAPIMeta):
         refresh_token: str | None = None,
         customer_code: str = None,
         **get_tokens_param,
-    ) -> tuple[str, str, datetime]:
+    ) -> tuple[str, str, int]:
         tokens = None
         if refresh_token is None:
             if customer_code is None and not self.one_customer_mode:
                 raise ValueError("`refresh_token` or `customer_code` is required")
-            tokens = self.token_manager.get_tokens(
+            tokens = await self.token_manager.aget_tokens(
                 customer_code or self._customer_code, **get_tokens_param
             )
             refresh_token = tokens.refresh
@@ -294,7 +751,7 @@ class TochkaApiBase(TochkaAPIMeta):
         )
 
         if response.status_code == 200:
-            response_data = ujson.loads(response.text)
+            response_data = self.json_codec.loads(response.content)
             access_token = response_data["access_token"]
             refresh_token = response_data["refresh_token"]
             expires_in = response_data["expires_in"]
@@ -315,11 +772,37 @@ class TochkaApiBase(TochkaAPIMeta):
         self,
         access_token: str | None = None,
         customer_code: str = None,
+        local: bool = False,
+        introspect_fallback: bool = False,
+        leeway: float = 0,
         **get_tokens_params,
     ) -> bool:
+        """
+        Проверяет access-токен через ``/connect/introspect``.
+
+        С ``local=True`` запроса нет: проверяются claims ``exp``/``nbf`` из самого
+        JWT (подпись не проверяется, отзыв токена не виден). Если токен не удалось
+        разобрать как JWT, при ``introspect_fallback=True`` он проверяется
+        через introspect, иначе считается недействительным.
+        """
         if access_token is None:
-            tokens = self.token_manager.get_tokens(customer_code, **get_tokens_params)
+            tokens = await self.token_manager.aget_tokens(
+                customer_code, **get_tokens_params
+            )
             access_token = tokens.access
+
+        if local:
+            claims = decode_token_claims(str(access_token))
+            if claims is not None:
+                now = time.time()
+                if "exp" in claims and now >= claims["exp"] + leeway:
+                    return False
+                if "nbf" in claims and now < claims["nbf"] - leeway:
+                    return False
+                return True
+            if not introspect_fallback:
+                return False
+
         data = {
             "access_token": access_token,
         }
@@ -332,3 +815,96 @@ class TochkaApiBase(TochkaAPIMeta):
         )
 
         return response.status_code == 200
+
+
+class TochkaCustomer:
+    """
+    Клиент API, привязанный к одному пользователю (см. ``for_customer``).
+
+    Методы API выполняются с этим объектом вместо клиента: ``request`` передаёт
+    user_code и ``Tokens`` пользователя напрямую, остальные атрибуты читаются
+    и записываются у исходного клиента. Жизненным циклом (``open``/``aclose``,
+    фоновое обновление токенов) управляет исходный клиент.
+    """
+
+    __slots__ = ("api", "user_code", "tokens")
+
+    def __init__(
+        self, api: TochkaApiBase, user_code: str, tokens: Tokens | None = None
+    ):
+        object.__setattr__(self, "api", api)
+        object.__setattr__(self, "user_code", user_code)
+        object.__setattr__(self, "tokens", tokens)
+
+    def __getattr__(self, name: str):
+        return getattr(self.api, name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self.api, name, value)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} user_code={self.user_code!r}>"
+
+    def for_customer(self, user_code: str) -> "TochkaCustomer":
+        return self.api.for_customer(user_code)
+
+    def _current_user_code(self) -> str | None:
+        return self.user_code
+
+    async def request(
+        self,
+        method: Literal["GET", "POST", "PUT", "DELETE"] = "GET",
+        url: str = "",
+        headers: dict = None,
+        json: dict = None,
+        data: dict = None,
+        params: dict = None,
+        cookies: dict = None,
+        content: bytes = None,
+        auth_required: bool = True,
+        **get_tokens_params,
+    ) -> Response:
+        if auth_required and self.tokens is None:
+            tokens = await self.api.token_manager.aget_tokens(self.user_code)
+            object.__setattr__(self, "tokens", tokens)
+        return await self.api._request(
+            self.user_code if auth_required else None,
+            self.tokens if auth_required else None,
+            method=method,
+            url=url,
+            headers=headers,
+            json=json,
+            data=data,
+            params=params,
+            cookies=cookies,
+            content=content,
+            auth_required=auth_required,
+            **get_tokens_params,
+        )
+
+
+# управление жизненным циклом остаётся у исходного клиента
+CUSTOMER_DELEGATED_METHODS = frozenset(
+    {"open", "aclose", "start_token_refresher", "stop_token_refresher"}
+)
+
+
+@functools.lru_cache(maxsize=None)
+def customer_class(api_class: Type[TochkaApiBase]) -> Type[TochkaCustomer]:
+    """
+    Подкласс ``TochkaCustomer`` с методами ``api_class``: методы вызываются
+    через обычный поиск по классу, а не через ``__getattr__``
+    """
+    namespace = {}
+    for klass in reversed(api_class.__mro__):
+        for attr_name, attr in vars(klass).items():
+            if attr_name.startswith("__"):
+                continue
+            if inspect.isfunction(attr):
+                namespace[attr_name] = attr
+            else:
+                namespace.pop(attr_name, None)
+    for attr_name in [*vars(TochkaCustomer), *CUSTOMER_DELEGATED_METHODS]:
+        namespace.pop(attr_name, None)
+    namespace["__slots__"] = ()
+    return type(f"{api_class.__name__}Customer", (TochkaCustomer,), namespace)
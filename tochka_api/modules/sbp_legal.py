@@ -6,9 +6,12 @@ from models.responses import (
 )
 from models.responses.sbp_legal import SbpAccountsResponse
 from modules import TochkaApiBase
+from response_cache import cacheable, invalidates
+from retry import idempotent
 
 
 class TochkaApiSbpLegal(TochkaApiBase):
+    @cacheable
     async def sbp_get_customer_info(
         self,
         customer_code: str,
@@ -32,6 +35,7 @@ class TochkaApiSbpLegal(TochkaApiBase):
             method="GET", url=f"/sbp/v1.0/customer/{customer_code}/{bank_code}"
         )
 
+    @cacheable
     async def sbp_get_legal_entity(
         self, legal_id: str, user_code: str | None = None
     ) -> SbpLegalEntityResponse:
@@ -51,6 +55,8 @@ class TochkaApiSbpLegal(TochkaApiBase):
             method="GET", url=f"/sbp/v1.0/legal-entity/{legal_id}"
         )
 
+    @idempotent
+    @invalidates("sbp_get_legal_entity", "sbp_get_customer_info")
     async def sbp_set_legal_entity_status(
         self,
         legal_id: str,
@@ -83,6 +89,7 @@ class TochkaApiSbpLegal(TochkaApiBase):
             json=data,
         )
 
+    @invalidates("sbp_get_legal_entity", "sbp_get_customer_info")
     async def sbp_register_legal_entity(
         self,
         customer_code: str,
@@ -115,6 +122,7 @@ class TochkaApiSbpLegal(TochkaApiBase):
             json=data,
         )
 
+    @cacheable
     async def sbp_get_accounts(
         self, legal_id: str, user_code: str | None = None
     ) -> SbpAccountsResponse:
@@ -4,9 +4,11 @@ from models.responses import (
     TochkaBooleanResponse,
 )
 from modules import TochkaApiBase
+from response_cache import cacheable, invalidates
 
 
 class TochkaApiSbpMerchant(TochkaApiBase):
+    @cacheable
     async def sbp_get_merchants(
         self, legal_id: str, tochka_user_code: str | None = None
     ) -> SbpMerchantsResponse:
@@ -27,6 +29,7 @@ class TochkaApiSbpMerchant(TochkaApiBase):
             url=f"/sbp/v1.0/merchant/legal-entity/{legal_id}",
         )
 
+    @cacheable
     async def sbp_get_merchant(
         self, merchant_id: str, user_code: str | None = None
     ) -> SbpMerchantsResponse:
@@ -50,6 +53,7 @@ class TochkaApiSbpMerchant(TochkaApiBase):
             url=f"/sbp/v1.0/merchant/{merchant_id}",
         )
 
+    @invalidates("sbp_get_merchants")
     async def sbp_register_merchant(
         self,
         legal_id: str,
@@ -114,6 +118,7 @@ class TochkaApiSbpMerchant(TochkaApiBase):
             method="POST", url=f"/sbp/v1.0/merchant/legal-entity/{legal_id}", json=data
         )
 
+    @invalidates("sbp_get_merchants", "sbp_get_merchant")
     async def sbp_set_merchant_status(
         self,
         merchant_id: str,
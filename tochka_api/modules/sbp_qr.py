@@ -1,7 +1,7 @@
 import re
 from decimal import Decimal
 from datetime import date, datetime, timedelta
-from typing import Literal
+from typing import Iterable, Literal, Mapping
 
 from models.responses import (
     SbpQrPaymentDataResponse,
@@ -11,6 +11,9 @@ from models.responses import (
     TochkaBooleanResponse,
 )
 from modules import TochkaApiBase
+from qr_bulk import SbpQrBulkRegistration
+from qr_watcher import QR_PAYMENT_STATUS_URL, SbpQrPaymentWatcher
+from rate_limiter import PRIORITY_INTERACTIVE, priority
 
 
 class TochkaApiSbpQr(TochkaApiBase):
@@ -57,6 +60,7 @@ class TochkaApiSbpQr(TochkaApiBase):
             url=f"/sbp/v1.0/qr-code/{qrc_id}",
         )
 
+    @priority(PRIORITY_INTERACTIVE)
     async def sbp_register_qr(
         self,
         merchant_id: str,
@@ -70,6 +74,7 @@ class TochkaApiSbpQr(TochkaApiBase):
         height: int = 300,
         media_type: Literal["image/png", "image/svg+xml"] = "image/png",
         source_name: str = "https://github.com/whiteapfel/tochka_api",
+        with_image: bool = True,
         user_code: str | None = None,
     ) -> SbpRegisterQrResponse:
         """
@@ -100,6 +105,9 @@ class TochkaApiSbpQr(TochkaApiBase):
         :type media_type: ``str``, default=``"image/png"``
         :param source_name: Название системы, выпустившей QR код
         :type source_name: ``str``, optional
+        :param with_image: запросить изображение QR кода; без него ответ быстрее
+            и меньше, а ``image`` будет ``None``
+        :type with_image: ``bool``, default=``True``
         :return: Схема RegisteredQrCode
         :rtype: SbpRegisterQrResponse
         """
@@ -110,14 +118,15 @@ class TochkaApiSbpQr(TochkaApiBase):
                 "qrcType": ("01" if is_static else "02")
                 if type(is_static) is bool
                 else is_static,
-                "imageParams": {
-                    "width": width,
-                    "height": height,
-                    "media_type": media_type,
-                },
                 "sourceName": source_name,
             }
         }
+        if with_image:
+            data["Data"]["imageParams"] = {
+                "width": width,
+                "height": height,
+                "media_type": media_type,
+            }
         if not is_static:
             data["Data"]["ttl"] = ttl or 0
             if amount is None:
@@ -218,6 +227,21 @@ class TochkaApiSbpQr(TochkaApiBase):
         if isinstance(qrc_ids, str):
             qrc_ids = [qrc_ids]
 
+        return await self.request(
+            method="GET",
+            url=QR_PAYMENT_STATUS_URL.format(qrc_ids=",".join(qrc_ids)),
+            params=self._qrs_payment_status_params(from_date, to_date),
+        )
+
+    @staticmethod
+    def _qrs_payment_status_params(
+        from_date: datetime | date | int | str | None = None,
+        to_date: datetime | date | int | str | None = None,
+    ) -> dict[str, str]:
+        """
+        Параметры запроса sbp_get_qrs_payment_status; по ним же
+        SbpQrPaymentWatcher считает длину URL пачки
+        """
         params = {}
 
         if from_date is not None:
@@ -246,8 +270,82 @@ class TochkaApiSbpQr(TochkaApiBase):
 
             params["toDate"] = to_date
 
-        return await self.request(
-            method="GET",
-            url=f"/sbp/v1.0/qr-code/{','.join(qrc_ids)}/payment-status",
-            params=params,
+        return params
+
+    def sbp_register_qrs(
+        self,
+        specs: Iterable[Mapping],
+        max_concurrency: int = 8,
+        rate: float | None = None,
+        with_image: bool = False,
+        user_code: str | None = None,
+        **common_params,
+    ) -> SbpQrBulkRegistration:
+        """
+        Массовая регистрация QR кодов через sbp_register_qr.
+
+        Каждый элемент ``specs`` — параметры sbp_register_qr, дополняющие
+        ``common_params``. Регистрации выполняются параллельно, результаты
+        с ошибками по отдельным QR кодам отдаются по мере готовности,
+        скорость доступна в ``stats``. По умолчанию изображения QR кодов
+        не запрашиваются, в ответах есть только ``qrc_id`` и ``payload``.
+
+        Пример::
+
+            bulk = api.sbp_register_qrs(
+                ({"amount": amount} for amount in amounts),
+                merchant_id=merchant_id, account=account, is_static=False, ttl=60,
+            )
+            async for registration in bulk:
+                ...
+            print(bulk.stats.per_second)
+
+        :param user_code:
+        :param specs: параметры QR кодов
+        :type specs: ``Iterable[Mapping]``
+        :param max_concurrency: сколько регистраций выполняется одновременно
+        :type max_concurrency: ``int``, default=``8``
+        :param rate: не больше ``rate`` регистраций в секунду
+        :type rate: ``float``, optional
+        :param with_image: запрашивать изображения QR кодов
+        :type with_image: ``bool``, default=``False``
+        :return: Итератор результатов регистрации
+        :rtype: SbpQrBulkRegistration
+        """
+        return SbpQrBulkRegistration(
+            self,
+            specs,
+            max_concurrency=max_concurrency,
+            rate=rate,
+            with_image=with_image,
+            user_code=user_code,
+            **common_params,
+        )
+
+    def watch_qrs_payment_status(
+        self,
+        qrc_ids: Iterable[str] = (),
+        ttl: int | None = None,
+        user_code: str | None = None,
+        **watcher_params,
+    ) -> SbpQrPaymentWatcher:
+        """
+        Создаёт наблюдатель за статусами оплаты динамических QR-кодов.
+
+        Ожидающие QR-коды опрашиваются пачками через sbp_get_qrs_payment_status,
+        часто сразу после создания и реже по мере истечения TTL.
+        Изменения статусов отдаются через ``async for`` или ``callback``.
+
+        Пример: ``async for payment in api.watch_qrs_payment_status(qrc_ids, ttl=15): ...``
+
+        :param user_code:
+        :param qrc_ids: идентификаторы QR кодов в СБП
+        :type qrc_ids: ``Iterable[str]``
+        :param ttl: Период активности QR кодов в минутах
+        :type ttl: ``int``, optional
+        :return: Наблюдатель, в который можно добавлять QR-коды через ``add``
+        :rtype: SbpQrPaymentWatcher
+        """
+        return SbpQrPaymentWatcher(
+            self, qrc_ids, ttl=ttl, user_code=user_code, **watcher_params
         )
@@ -1,13 +1,40 @@
+import asyncio
 import re
+import time
 from _decimal import Decimal
 from datetime import datetime, timedelta, date
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Mapping
 
+from deadline import timeout
 from models.responses import SbpPaymentsResponse, SbpRefundResponse
+from models.responses.sbp_refunds import (
+    Payment,
+    SbpPaymentsWindow,
+    SbpPaymentsWindowsResult,
+)
 from modules import TochkaApiBase
+from rate_limiter import PRIORITY_BACKGROUND, priority
+from refund_executor import SbpBulkRefund
+from retry import not_idempotent
 from settings import CHARS_FOR_PURPOSE
 
 
+def _to_date(value: datetime | date | int | str) -> date:
+    if isinstance(value, int):
+        return (datetime.now() - timedelta(days=value)).date()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not re.match(r"^\d{4}-\d{2}-\d{2}$", value):
+        raise ValueError("date must be in 'YYYY-MM-DD' format (%Y-%m-%d)")
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
 class TochkaApiSbpRefunds(TochkaApiBase):
+    @priority(PRIORITY_BACKGROUND)
+    @timeout(60)
     async def sbp_get_payments(
         self,
         customer_code: str,
@@ -76,10 +103,195 @@ class TochkaApiSbpRefunds(TochkaApiBase):
 
         return await self.request(
             method="GET",
-            url=f"/sbp/v1.0/get-sbp-payments?customerCode={customer_code}&fromDate={from_date}&toDate={to_date}",
+            url="/sbp/v1.0/get-sbp-payments",
             params=params,
         )
 
+    async def iter_sbp_payments(
+        self,
+        customer_code: str,
+        qrc_id: str | None = None,
+        from_date: datetime | date | int | str | None = None,
+        to_date: datetime | date | int | str | None = None,
+        per_page: int = 1000,
+        start_page: int = 1,
+        user_code: str | None = None,
+    ) -> AsyncIterator[Payment]:
+        """
+        Постранично обходит список платежей в Системе быстрых платежей
+        и отдаёт платежи по одному.
+
+        Пока обрабатывается текущая страница, следующая уже запрашивается,
+        поэтому в памяти одновременно находится не больше двух страниц.
+
+        Пример: ``async for payment in api.iter_sbp_payments(customer_code): ...``
+
+        :param user_code:
+        :param customer_code: Код клиента в Точке
+        :type customer_code: ``str``
+        :param qrc_id: идентификатор QR кода в СБП
+        :type qrc_id: ``str``
+        :param from_date: начало периода для получения статусов
+        :type from_date: ``datetime`` | ``date`` | ``int`` | ``str``, optional
+        :param to_date: конец периодов для получения статусов
+        :type to_date: ``datetime`` | ``date`` | ``int`` | ``str``, optional
+        :param per_page: количество элементов на страницу
+        :type per_page: ``int``, default=``1000``
+        :param start_page: страница, с которой начинается обход
+        :type start_page: ``int``, default=``1``
+        :return: Платежи из схемы SBPPaymentList
+        :rtype: ``AsyncIterator[Payment]``
+        """
+
+        def fetch_page(page_number: int) -> asyncio.Future:
+            return asyncio.ensure_future(
+                self.sbp_get_payments(
+                    customer_code,
+                    qrc_id=qrc_id,
+                    from_date=from_date,
+                    to_date=to_date,
+                    page=page_number,
+                    per_page=per_page,
+                    user_code=user_code,
+                )
+            )
+
+        page = start_page
+        next_page = fetch_page(page)
+        try:
+            while next_page is not None:
+                response: SbpPaymentsResponse = await next_page
+                next_page = None
+                if not self._is_last_sbp_payments_page(response, page, per_page):
+                    page += 1
+                    next_page = fetch_page(page)
+                for payment in response.payments:
+                    yield payment
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def sbp_get_payments_by_windows(
+        self,
+        customer_code: str,
+        from_date: datetime | date | int | str,
+        to_date: datetime | date | int | str | None = None,
+        qrc_id: str | None = None,
+        window_days: int = 1,
+        max_concurrency: int = 4,
+        per_page: int = 1000,
+        user_code: str | None = None,
+    ) -> SbpPaymentsWindowsResult:
+        """
+        Получает платежи за длинный период, разбивая его на окна по ``window_days``
+        дней и запрашивая окна параллельно, не больше ``max_concurrency`` одновременно.
+        Страницы одного окна запрашиваются последовательно, поэтому одновременно
+        выполняется не больше ``max_concurrency`` запросов. Ошибка загрузки окна
+        отменяет загрузку остальных и пробрасывается вызывающему.
+
+        Платежи возвращаются в хронологическом порядке окон, без повторов
+        по ``trx_id`` (refTransactionId). Для каждого окна сохраняется количество
+        платежей и время загрузки, чтобы можно было подобрать параллельность.
+
+        Параметры ``from/to_date`` принимают те же значения, что и в sbp_get_payments,
+        ``int`` расценивается как количество дней назад. Без ``to_date`` период
+        заканчивается сегодняшним днём.
+
+        :param user_code:
+        :param customer_code: Код клиента в Точке
+        :type customer_code: ``str``
+        :param from_date: начало периода
+        :type from_date: ``datetime`` | ``date`` | ``int`` | ``str``
+        :param to_date: конец периода, включительно
+        :type to_date: ``datetime`` | ``date`` | ``int`` | ``str``, optional
+        :param qrc_id: идентификатор QR кода в СБП
+        :type qrc_id: ``str``, optional
+        :param window_days: размер окна в днях
+        :type window_days: ``int``, default=``1``
+        :param max_concurrency: сколько окон (и запросов) загружается одновременно
+        :type max_concurrency: ``int``, default=``4``
+        :param per_page: количество элементов на страницу
+        :type per_page: ``int``, default=``1000``
+        :return: Платежи и статистика по окнам
+        :rtype: SbpPaymentsWindowsResult
+        """
+        if window_days < 1:
+            raise ValueError("window_days must be positive")
+
+        period_start = _to_date(from_date)
+        period_end = _to_date(to_date) if to_date is not None else date.today()
+
+        windows: list[tuple[date, date]] = []
+        window_start = period_start
+        while window_start <= period_end:
+            window_end = min(window_start + timedelta(days=window_days - 1), period_end)
+            windows.append((window_start, window_end))
+            window_start = window_end + timedelta(days=1)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch_window(
+            window_from: date, window_to: date
+        ) -> tuple[list[Payment], SbpPaymentsWindow]:
+            async with semaphore:
+                started = time.perf_counter()
+                payments: list[Payment] = []
+                page = 1
+                # страницы окна запрашиваются по очереди, без упреждающей загрузки
+                # iter_sbp_payments: одно окно — не больше одного запроса
+                while True:
+                    response: SbpPaymentsResponse = await self.sbp_get_payments(
+                        customer_code,
+                        qrc_id=qrc_id,
+                        from_date=window_from,
+                        to_date=window_to,
+                        page=page,
+                        per_page=per_page,
+                        user_code=user_code,
+                    )
+                    payments.extend(response.payments)
+                    if self._is_last_sbp_payments_page(response, page, per_page):
+                        break
+                    page += 1
+                return payments, SbpPaymentsWindow(
+                    from_date=window_from,
+                    to_date=window_to,
+                    payments_count=len(payments),
+                    elapsed=time.perf_counter() - started,
+                )
+
+        tasks = [asyncio.ensure_future(fetch_window(*w)) for w in windows]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # ошибка одного окна отменяет загрузку остальных
+            for task in tasks:
+                task.cancel()
+            raise
+
+        seen_trx_ids: set[str] = set()
+        payments: list[Payment] = []
+        for window_payments, _ in results:
+            for payment in window_payments:
+                if payment.trx_id not in seen_trx_ids:
+                    seen_trx_ids.add(payment.trx_id)
+                    payments.append(payment)
+
+        # construct: платежи уже провалидированы, копировать их незачем
+        return SbpPaymentsWindowsResult.construct(
+            payments=payments, windows=[window for _, window in results]
+        )
+
+    @staticmethod
+    def _is_last_sbp_payments_page(
+        response: SbpPaymentsResponse, page: int, per_page: int
+    ) -> bool:
+        total_pages = response.meta.get("totalPages")
+        if total_pages is not None:
+            return page >= int(total_pages)
+        return len(response.payments) < per_page
+
+    @not_idempotent
     async def sbp_start_refund(
         self,
         account: str,
@@ -182,3 +394,54 @@ class TochkaApiSbpRefunds(TochkaApiBase):
         :rtype: SbpRefundResponse
         """
         return await self.request(method="GET", url=f"/sbp/v1.0/refund/{request_id}")
+
+    def sbp_start_refunds(
+        self,
+        refunds: Iterable[Mapping],
+        journal_path: str | Path,
+        max_concurrency: int = 4,
+        poll_interval: float = 2,
+        user_code: str | None = None,
+        **common_params,
+    ) -> SbpBulkRefund:
+        """
+        Массовые возвраты через sbp_start_refund с журналом отправленных возвратов.
+
+        Каждый элемент ``refunds`` — параметры sbp_start_refund, дополняющие
+        ``common_params``; повторы ``trx_id`` отбрасываются. Отправленные
+        ``request_id`` записываются в журнал ``journal_path``: после падения
+        запуск с тем же журналом не создаёт возврат повторно, а дожидается
+        уже созданного. Возвраты опрашиваются через sbp_get_refund_data,
+        пока не будут приняты или отклонены.
+
+        Пример::
+
+            refunds = api.sbp_start_refunds(
+                ({"trx_id": p.trx_id, "qrc_id": p.qrc_id, "amount": 100} for p in payments),
+                journal_path="refunds-2024-05-01.jsonl",
+                account=account,
+            )
+            async for result in refunds:
+                ...
+
+        :param user_code:
+        :param refunds: параметры возвратов
+        :type refunds: ``Iterable[Mapping]``
+        :param journal_path: путь к файлу журнала возвратов
+        :type journal_path: ``str`` | ``Path``
+        :param max_concurrency: сколько запросов выполняется одновременно
+        :type max_concurrency: ``int``, default=``4``
+        :param poll_interval: начальный интервал опроса статусов в секундах
+        :type poll_interval: ``float``, default=``2``
+        :return: Итератор итогов возвратов
+        :rtype: SbpBulkRefund
+        """
+        return SbpBulkRefund(
+            self,
+            refunds,
+            journal_path,
+            max_concurrency=max_concurrency,
+            poll_interval=poll_interval,
+            user_code=user_code,
+            **common_params,
+        )
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import AsyncIterator, Iterable, Iterator, Mapping
+
+from exceptions import TochkaError
+from models.responses.sbp_qr import SbpQrRegistration, SbpQrRegistrationStats
+from modules.base import context_priority
+from rate_limiter import PRIORITY_BACKGROUND, TokenBucket
+
+_DONE = object()
+
+
+class SbpQrBulkRegistration:
+    """
+    Регистрирует много QR-кодов через sbp_register_qr.
+
+    Не больше ``max_concurrency`` регистраций выполняются одновременно,
+    с ``rate`` — не чаще ``rate`` в секунду. Результаты (``SbpQrRegistration``)
+    отдаются через ``async for`` по мере готовности, не в порядке ``specs``;
+    ошибка регистрации попадает в ``error`` результата и не прерывает остальные.
+    Параметры QR кода берутся из ``common_params``, дополненных элементом ``specs``.
+
+    Запросы идут с приоритетом ``priority`` в ``RateLimiter`` клиента, поэтому
+    по умолчанию уступают интерактивным регистрациям.
+    Скорость доступна в ``stats`` во время и после обхода.
+    """
+
+    def __init__(
+        self,
+        api,
+        specs: Iterable[Mapping],
+        max_concurrency: int = 8,
+        rate: float | None = None,
+        with_image: bool = False,
+        priority: int = PRIORITY_BACKGROUND,
+        user_code: str | None = None,
+        **common_params,
+    ):
+        self.api = api
+        self.specs: Iterable[Mapping] = specs
+        self.max_concurrency: int = max_concurrency
+        self.bucket: TokenBucket | None = (
+            TokenBucket(rate, max(max_concurrency, 1)) if rate is not None else None
+        )
+        self.priority: int = priority
+        self.common_params: dict = common_params | {
+            "with_image": with_image,
+            "user_code": user_code,
+        }
+
+        self.succeeded: int = 0
+        self.failed: int = 0
+        self._started_at: float | None = None
+        self._finished_at: float | None = None
+
+    @property
+    def stats(self) -> SbpQrRegistrationStats:
+        now = self._finished_at or time.perf_counter()
+        elapsed = now - self._started_at if self._started_at is not None else 0
+        total = self.succeeded + self.failed
+        return SbpQrRegistrationStats.construct(
+            total=total,
+            succeeded=self.succeeded,
+            failed=self.failed,
+            elapsed=elapsed,
+            per_second=total / elapsed if elapsed else 0,
+        )
+
+    async def _register(self, index: int, spec: Mapping) -> SbpQrRegistration:
+        params = self.common_params | dict(spec)
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = await self.api.sbp_register_qr(**params)
+        except (Exception, TochkaError) as register_error:
+            error = register_error
+            self.failed += 1
+        else:
+            self.succeeded += 1
+        return SbpQrRegistration.construct(
+            index=index,
+            params=params,
+            response=response,
+            error=error,
+            elapsed=time.perf_counter() - started,
+        )
+
+    async def _worker(self, specs: Iterator, results: asyncio.Queue) -> None:
+        context_priority.set(self.priority)  # контекст задачи, а не вызывающего
+        for index, spec in specs:
+            if self.bucket is not None:
+                await self.bucket.acquire(self.priority)
+            await results.put(await self._register(index, spec))
+
+    async def __aiter__(self) -> AsyncIterator[SbpQrRegistration]:
+        self._started_at, self._finished_at = time.perf_counter(), None
+        results = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        specs = enumerate(self.specs)  # общий итератор: specs читаются по мере работы
+        workers = [
+            asyncio.create_task(self._worker(specs, results))
+            for _ in range(self.max_concurrency)
+        ]
+
+        async def finish() -> None:
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                await results.put(_DONE)
+
+        finisher = asyncio.create_task(finish())
+        try:
+            while (result := await results.get()) is not _DONE:
+                yield result
+            await finisher  # ошибка чтения specs пробрасывается вызывающему
+        finally:
+            self._finished_at = time.perf_counter()
+            for task in (*workers, finisher):
+                task.cancel()
+
+    async def collect(self) -> list[SbpQrRegistration]:
+        """
+        Регистрирует все QR коды и возвращает результаты в порядке ``specs``
+        """
+        results = [result async for result in self]
+        results.sort(key=lambda result: result.index)
+        return results
@@ -0,0 +1,223 @@
+import asyncio
+import inspect
+import time
+from datetime import date, datetime
+from typing import AsyncIterator, Awaitable, Callable, Iterable
+
+from exceptions import TochkaClientError, TochkaError, TochkaServerError
+from httpx import URL, TransportError
+from models.responses.sbp_qr import SbpQrPayment
+
+QR_TERMINAL_STATUSES = frozenset({"Accepted", "Rejected"})
+QR_PAYMENT_STATUS_URL = "/sbp/v1.0/qr-code/{qrc_ids}/payment-status"
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Ошибка, после которой запрос имеет смысл повторить: сетевая ошибка,
+    5xx, 429, разомкнутая цепь или истёкший дедлайн
+    """
+    if isinstance(error, (TransportError, TochkaServerError, TochkaClientError)):
+        return True
+    return isinstance(error, TochkaError) and error.status_code == 429
+
+
+class WatchedQr:
+    __slots__ = ("qrc_id", "added_at", "ttl", "status", "next_poll_at")
+
+    def __init__(self, qrc_id: str, added_at: float, ttl: float | None):
+        self.qrc_id: str = qrc_id
+        self.added_at: float = added_at
+        self.ttl: float | None = ttl
+        self.status: str | None = None
+        self.next_poll_at: float = added_at
+
+
+class SbpQrPaymentWatcher:
+    """
+    Следит за статусами оплаты множества динамических QR-кодов.
+
+    Ожидающие QR-коды опрашиваются пачками: один запрос
+    sbp_get_qrs_payment_status на пачку, длина URL пачки не превышает
+    ``max_url_length``. Сразу после добавления QR-код опрашивается каждые
+    ``fast_interval`` секунд, затем интервал растёт до ``slow_interval``
+    по мере истечения TTL (или ``slowdown_after`` секунд, если TTL не указан).
+    QR-коды в статусах Accepted/Rejected и с истёкшим TTL перестают опрашиваться.
+    ``from_date``/``to_date`` передаются в каждый запрос, как в
+    sbp_get_qrs_payment_status, и учитываются в длине URL.
+
+    Пачки, опрос которых завершился временной ошибкой (сеть, 5xx, 429),
+    опрашиваются снова на следующем интервале. Любая другая ошибка, а также
+    ``max_failures`` опросов подряд, в которых ни одна пачка не ответила,
+    прерывают обход: ошибка пробрасывается из ``poll``, ``async for`` и ``run``.
+
+    Изменения статусов можно получать через ``async for payment in watcher``
+    или передав ``callback`` и запустив ``await watcher.run()``.
+    """
+
+    def __init__(
+        self,
+        api,
+        qrc_ids: Iterable[str] = (),
+        ttl: int | None = None,
+        user_code: str | None = None,
+        callback: Callable[[SbpQrPayment], Awaitable[None] | None] | None = None,
+        fast_interval: float = 2,
+        slow_interval: float = 30,
+        slowdown_after: float = 300,
+        expire_grace: float = 60,
+        max_url_length: int = 2000,
+        max_concurrency: int = 4,
+        from_date: datetime | date | int | str | None = None,
+        to_date: datetime | date | int | str | None = None,
+        max_failures: int = 10,
+    ):
+        self.api = api
+        self.user_code: str | None = user_code
+        self.callback = callback
+        self.fast_interval: float = fast_interval
+        self.slow_interval: float = slow_interval
+        self.slowdown_after: float = slowdown_after
+        self.expire_grace: float = expire_grace
+        self.max_url_length: int = max_url_length
+        self.from_date: datetime | date | int | str | None = from_date
+        self.to_date: datetime | date | int | str | None = to_date
+        self.max_failures: int = max_failures
+        self.failures: int = 0
+
+        self.expired: list[str] = []
+        self._watched: dict[str, WatchedQr] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+        for qrc_id in qrc_ids:
+            self.add(qrc_id, ttl=ttl)
+
+    @property
+    def pending(self) -> set[str]:
+        return set(self._watched)
+
+    def add(self, qrc_id: str, ttl: int | None = None) -> None:
+        """
+        :param qrc_id: идентификатор QR кода в СБП
+        :param ttl: Период активности QR кода в минутах, как в sbp_register_qr
+        """
+        if qrc_id in self._watched:
+            return
+        self._watched[qrc_id] = WatchedQr(
+            qrc_id,
+            added_at=time.monotonic(),
+            ttl=ttl * 60 if ttl else None,
+        )
+        self._wakeup.set()
+
+    def remove(self, qrc_id: str) -> None:
+        self._watched.pop(qrc_id, None)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+
+    def _interval(self, watched: WatchedQr, now: float) -> float:
+        horizon = watched.ttl or self.slowdown_after
+        progress = min((now - watched.added_at) / horizon, 1)
+        return self.fast_interval + (self.slow_interval - self.fast_interval) * progress
+
+    def _chunks(self, qrc_ids: list[str]) -> list[list[str]]:
+        # URL пачки без идентификаторов, с теми же параметрами, что и в запросе
+        empty_url = URL(
+            self.api._base_url + QR_PAYMENT_STATUS_URL.format(qrc_ids=""),
+            params=self.api._qrs_payment_status_params(self.from_date, self.to_date),
+        )
+        budget = self.max_url_length - len(str(empty_url))
+        chunks, chunk, chunk_length = [], [], 0
+        for qrc_id in qrc_ids:
+            length = len(qrc_id) + (1 if chunk else 0)
+            if chunk and chunk_length + length > budget:
+                chunks.append(chunk)
+                chunk, chunk_length, length = [], 0, len(qrc_id)
+            chunk.append(qrc_id)
+            chunk_length += length
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    async def _poll_chunk(self, chunk: list[str]) -> list[SbpQrPayment]:
+        async with self._semaphore:
+            response = await self.api.sbp_get_qrs_payment_status(
+                chunk,
+                from_date=self.from_date,
+                to_date=self.to_date,
+                user_code=self.user_code,
+            )
+        return response.payments
+
+    async def poll(self) -> list[SbpQrPayment]:
+        """
+        Опрашивает QR-коды, для которых подошло время, и возвращает изменения статусов
+        """
+        now = time.monotonic()
+        due = []
+        for qrc_id, watched in list(self._watched.items()):
+            if watched.ttl and now - watched.added_at > watched.ttl + self.expire_grace:
+                del self._watched[qrc_id]
+                self.expired.append(qrc_id)
+            elif watched.next_poll_at <= now:
+                watched.next_poll_at = now + self._interval(watched, now)
+                due.append(qrc_id)
+
+        if not due:
+            return []
+
+        results = await asyncio.gather(
+            *(self._poll_chunk(chunk) for chunk in self._chunks(due)),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for error in errors:
+            if not is_transient_error(error):
+                raise error
+        if len(errors) < len(results):
+            self.failures = 0
+        elif errors:
+            # QR-коды будут опрошены снова на следующем интервале
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                raise errors[-1]
+
+        transitions = []
+        for payments in results:
+            if isinstance(payments, BaseException):
+                continue
+            for payment in payments:
+                watched = self._watched.get(payment.qrc_id)
+                if watched is None or watched.status == payment.status:
+                    continue
+                watched.status = payment.status
+                transitions.append(payment)
+                if payment.status in QR_TERMINAL_STATUSES:
+                    del self._watched[payment.qrc_id]
+        return transitions
+
+    async def __aiter__(self) -> AsyncIterator[SbpQrPayment]:
+        while self._watched and not self._closed:
+            for payment in await self.poll():
+                yield payment
+
+            if not self._watched or self._closed:
+                break
+            delay = min(w.next_poll_at for w in self._watched.values())
+            delay -= time.monotonic()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> None:
+        async for payment in self:
+            if self.callback is not None:
+                result = self.callback(payment)
+                if inspect.isawaitable(result):
+                    await result
@@ -0,0 +1,264 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+
+from deadline import time_left, within_deadline
+from httpx import Response
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+
+ENDPOINT_GROUP_AUTH = "auth"
+ENDPOINT_GROUP_SBP = "sbp"
+ENDPOINT_GROUP_OPEN_BANKING = "open_banking"
+
+
+def priority(level: int):
+    """
+    Задаёт приоритет метода API в очереди ``RateLimiter``:
+    чем меньше значение, тем раньше запрос получит разрешение
+    """
+
+    def decorator(function):
+        function.priority = level
+        return function
+
+    return decorator
+
+
+def endpoint_group(url: str) -> str:
+    if url.startswith("https://"):
+        return ENDPOINT_GROUP_AUTH
+    if url.startswith("/sbp/"):
+        return ENDPOINT_GROUP_SBP
+    return ENDPOINT_GROUP_OPEN_BANKING
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Значение заголовка Retry-After в секундах: число секунд или HTTP-дата
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def check_limit(rate: float, burst: float | None) -> None:
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    if burst is not None and burst < 1:
+        raise ValueError("burst must be at least 1")
+
+
+class TokenBucket:
+    """
+    Token bucket с очередью ожидания по приоритетам.
+
+    Запрос, которому не хватило токена, не получает ошибку, а ждёт в очереди;
+    очередь обслуживается по возрастанию приоритета, внутри приоритета по FIFO.
+
+    :param rate: скорость пополнения, запросов в секунду
+    :param burst: ёмкость корзины
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        check_limit(rate, burst)
+        self.rate: float = rate
+        self.burst: float = burst if burst is not None else max(rate, 1)
+        self.tokens: float = self.burst
+        self.paused_until: float = 0
+        self._updated_at: float = time.monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | asyncio.Handle | None = None
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def is_idle(self) -> bool:
+        """
+        Корзина никого не ждёт, не на паузе и заполнена: её можно удалить
+        и при следующем запросе создать заново без изменения поведения
+        """
+        if self._waiters or self._timer is not None:
+            return False
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        return self.tokens >= self.burst
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.burst, self.tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def _try_take(self) -> bool:
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> None:
+        if not self._waiters and self._try_take():
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._timer is None:
+            self._timer = loop.call_soon(self._dispatch)
+        await future
+
+    def pause(self, seconds: float) -> None:
+        """
+        Приостанавливает выдачу токенов, например по Retry-After ответа 429
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():  # ожидание отменено
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take():
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+        if not self._waiters:
+            return
+
+        now = time.monotonic()
+        delay = max(self.paused_until - now, (1 - self.tokens) / self.rate, 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+class RateLimiter:
+    """
+    Клиентское ограничение частоты запросов.
+
+    Запрос ждёт разрешения в общей корзине (``rate``/``burst``) и в корзине
+    своей группы методов (``group_limits``: ``sbp``, ``open_banking``, ``auth``),
+    отдельной для каждого user_code при ``per_user=True``.
+
+    На ответ 429 корзина запроса приостанавливается на время из Retry-After
+    (или ``default_retry_after``), а запрос снова встаёт в очередь,
+    не более ``max_throttled_retries`` раз и только если ожидание
+    укладывается в ``deadline``.
+
+    :param rate: общий лимит, запросов в секунду
+    :param burst: ёмкость общей корзины
+    :param group_limits: лимиты групп методов ``{группа: (rate, burst)}``
+    :param per_user: отдельные корзины групп для каждого user_code
+    :param max_idle_buckets: сколько корзин групп хранится, прежде чем
+        простаивающие заполненные корзины удаляются
+    """
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        burst: float | None = None,
+        group_limits: dict[str, tuple[float, float | None]] | None = None,
+        per_user: bool = True,
+        max_throttled_retries: int = 5,
+        default_retry_after: float = 1,
+        max_retry_after: float = 60,
+        max_idle_buckets: int = 1024,
+    ):
+        if rate is not None:
+            check_limit(rate, burst)
+        for group_rate, group_burst in (group_limits or {}).values():
+            check_limit(group_rate, group_burst)
+
+        self.group_limits: dict[str, tuple[float, float | None]] = group_limits or {}
+        self.per_user: bool = per_user
+        self.max_throttled_retries: int = max_throttled_retries
+        self.default_retry_after: float = default_retry_after
+        self.max_retry_after: float = max_retry_after
+
+        self.global_bucket: TokenBucket | None = (
+            TokenBucket(rate, burst) if rate is not None else None
+        )
+        self._group_buckets: dict[tuple[str | None, str], TokenBucket] = {}
+        self.max_idle_buckets: int = max_idle_buckets
+        self._prune_at: int = max_idle_buckets
+
+    def buckets_for(self, user_code: str | None, url: str) -> list[TokenBucket]:
+        buckets = []
+        if self.global_bucket is not None:
+            buckets.append(self.global_bucket)
+        group = endpoint_group(url)
+        limit = self.group_limits.get(group)
+        if limit is not None:
+            key = (user_code if self.per_user else None, group)
+            bucket = self._group_buckets.get(key)
+            if bucket is None:
+                self._prune_idle_buckets()
+                bucket = self._group_buckets[key] = TokenBucket(*limit)
+            buckets.append(bucket)
+        return buckets
+
+    def _prune_idle_buckets(self) -> None:
+        # при per_user корзин столько же, сколько пользователей: перебор идёт,
+        # только когда их число выросло вдвое с прошлой очистки
+        if len(self._group_buckets) < self._prune_at:
+            return
+        for key, bucket in list(self._group_buckets.items()):
+            if bucket.is_idle():
+                del self._group_buckets[key]
+        self._prune_at = max(self.max_idle_buckets, 2 * len(self._group_buckets))
+
+    async def call(
+        self,
+        send: Callable[[], Awaitable[Response]],
+        user_code: str | None,
+        url: str,
+        priority: int = PRIORITY_DEFAULT,
+    ) -> Response:
+        buckets = self.buckets_for(user_code, url)
+        throttled = 0
+        while True:
+            for bucket in buckets:
+                await within_deadline(bucket.acquire(priority))
+            response = await send()
+            if response.status_code != 429 or throttled >= self.max_throttled_retries:
+                return response
+
+            throttled += 1
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            delay = min(
+                delay if delay is not None else self.default_retry_after,
+                self.max_retry_after,
+            )
+            left = time_left()
+            if left is not None and left <= delay:
+                return response
+            # корзину могли удалить как простаивающую, пока шёл запрос
+            buckets = self.buckets_for(user_code, url)
+            if buckets:
+                # самая узкая корзина: лимит группы пользователя или общий
+                buckets[-1].pause(delay)
+            else:
+                await asyncio.sleep(delay)
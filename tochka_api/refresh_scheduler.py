@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import random
+import time
+
+from exceptions import TochkaError
+
+
+class TokenRefreshScheduler:
+    """
+    Фоновое обновление токенов незадолго до истечения срока их действия.
+
+    Все пользователи обслуживаются одной задачей с общей кучей таймеров,
+    поэтому планировщик не создаёт по задаче на каждый user_code.
+    Один планировщик может обслуживать несколько клиентов API
+    (см. ``TochkaClientPool``): пользователи различаются парой (клиент, user_code).
+    Планируются только токены, уже загруженные token_manager: ленивые хранилища
+    не расшифровывают при запуске планировщика токены всех пользователей.
+    """
+
+    def __init__(
+        self,
+        api=None,
+        lead_time: float = 60,
+        jitter: float = 30,
+        retry_interval: float = 30,
+        rescan_interval: float = 60,
+        max_concurrency: int = 10,
+    ):
+        self.lead_time: float = lead_time
+        self.jitter: float = jitter
+        self.retry_interval: float = retry_interval
+        self.rescan_interval: float = rescan_interval
+
+        self.apis: dict[int, object] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._due: dict[tuple[int, str], float] = {}
+        self._in_progress: set[tuple[int, str]] = set()
+        self._refresh_tasks: set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        if api is not None:
+            self.add(api)
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add(self, api) -> None:
+        """
+        Подключает клиента API: его пользователи попадут в расписание
+        """
+        if id(api) in self.apis:
+            return
+        self.apis[id(api)] = api
+        if self.is_running:
+            self._rescan_api(id(api), api)
+
+    def remove(self, api) -> None:
+        """
+        Отключает клиента API; его запланированные обновления отменяются
+        """
+        if self.apis.pop(id(api), None) is None:
+            return
+        for key in [key for key in self._due if key[0] == id(api)]:
+            del self._due[key]
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self.rescan()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает планировщик и отменяет уже начатые обновления, чтобы они
+        не писали в token_manager и HTTP-клиент после их закрытия
+        """
+        tasks = [*self._refresh_tasks]
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def rescan(self) -> None:
+        for api_id, api in list(self.apis.items()):
+            self._rescan_api(api_id, api)
+
+    def _rescan_api(self, api_id: int, api) -> None:
+        # только загруженные токены: пользователи, к которым ещё не обращались,
+        # попадут в расписание при следующем rescan после первой загрузки
+        for user_code in list(api.token_manager.loaded_tokens()):
+            key = (api_id, user_code)
+            if key not in self._due and key not in self._in_progress:
+                self._schedule(key, None)
+
+    def schedule(self, user_code: str, delay: float | None = None, api=None) -> None:
+        """
+        Планирует обновление токенов пользователя.
+
+        Без ``delay`` момент обновления вычисляется из срока действия access-токена
+        с учётом ``lead_time`` и случайного сдвига до ``jitter`` секунд.
+        ``api`` можно не указывать, если планировщик обслуживает одного клиента.
+        """
+        if api is None:
+            if len(self.apis) != 1:
+                raise ValueError("`api` is required when several clients are served")
+            (api_id,) = self.apis
+        else:
+            api_id = id(api)
+            self.add(api)
+        self._schedule((api_id, user_code), delay)
+
+    def _schedule(self, key: tuple[int, str], delay: float | None) -> None:
+        if delay is None:
+            delay = self._delay_for(key)
+            if delay is None:
+                self._due.pop(key, None)
+                return
+        due = asyncio.get_running_loop().time() + max(delay, 0)
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, *key))
+        if self._heap[0][1:] == key:
+            self._wakeup.set()
+
+    def _delay_for(self, key: tuple[int, str]) -> float | None:
+        api = self.apis.get(key[0])
+        if api is None:
+            return None
+        tokens = api.token_manager.loaded_tokens().get(key[1])
+        if tokens is None or tokens.refresh is None or tokens.access is None:
+            return None
+        expires_at = tokens.access.expires_at
+        if expires_at is None:
+            return None
+        return (
+            expires_at - time.time() - self.lead_time - random.uniform(0, self.jitter)
+        )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_rescan = loop.time() + self.rescan_interval
+        while True:
+            now = loop.time()
+            if now >= next_rescan:
+                self.rescan()
+                next_rescan = now + self.rescan_interval
+
+            while self._heap and self._heap[0][0] <= now:
+                due, *key = heapq.heappop(self._heap)
+                key = tuple(key)
+                if self._due.get(key) != due:
+                    continue  # запись устарела после перепланирования
+                del self._due[key]
+                self._in_progress.add(key)
+                # ссылка на задачу не даёт сборщику мусора удалить её до завершения
+                task = asyncio.create_task(self._refresh(key))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+
+            timeout = next_rescan - now
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self, key: tuple[int, str]) -> None:
+        api = self.apis.get(key[0])
+        try:
+            if api is None:
+                return
+            async with self._semaphore:
+                result = await api._refresh_tokens_single_flight(key[1])
+        except (Exception, TochkaError):
+            result = None
+        finally:
+            self._in_progress.discard(key)
+
+        if key[0] not in self.apis:
+            return
+        if result is None:
+            self._schedule(key, self.retry_interval * random.uniform(0.5, 1.5))
+        else:
+            self._schedule(key, None)
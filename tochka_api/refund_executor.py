@@ -0,0 +1,293 @@
+import asyncio
+import inspect
+import os
+import random
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Mapping
+
+import orjson
+from exceptions import (
+    TochkaCircuitOpenError,
+    TochkaClientError,
+    TochkaError,
+    TochkaServerError,
+)
+from httpx import ConnectError, ConnectTimeout
+from models.responses import SbpRefundResponse
+from models.responses.sbp_refunds import SbpBulkRefundResult
+
+REFUND_TERMINAL_STATUSES = frozenset({"Accepted", "Rejected"})
+
+# статусы журнала до получения request_id
+JOURNAL_SUBMITTING = "Submitting"  # запрос мог дойти до банка, результат неизвестен
+JOURNAL_NOT_SENT = "NotSent"  # запрос точно не выполнен, можно отправить снова
+JOURNAL_SUBMIT_FAILED = "SubmitFailed"  # банк отклонил запрос
+
+_DONE = object()
+
+
+class RefundJournal:
+    """
+    Журнал возвратов в файле JSON Lines: по записи на каждое изменение,
+    действует последняя запись для trx_id. Запись выполняется с ``fsync``
+    в пуле потоков, до и после каждого запроса на возврат
+    """
+
+    def __init__(self, path: str | Path):
+        self.path: Path = Path(path)
+        self.records: dict[str, dict] = {}
+        self._torn_tail: bool = False
+        self._lock = asyncio.Lock()
+
+    def load(self) -> dict[str, dict]:
+        self.records = {}
+        if not self.path.exists():
+            return self.records
+        with open(self.path, "rb") as journal_file:
+            for line in journal_file:
+                self._torn_tail = not line.endswith(b"\n")
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # запись, оборванная падением процесса
+                self.records[record["trx_id"]] = record
+        return self.records
+
+    async def aload(self) -> dict[str, dict]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.load)
+
+    def _append(self, line: bytes) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self._torn_tail:  # не дописывать к строке, оборванной падением
+            line, self._torn_tail = b"\n" + line, False
+        with open(self.path, "ab") as journal_file:
+            journal_file.write(line)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    async def write(
+        self, trx_id: str, status: str, request_id: str | None = None
+    ) -> None:
+        record = {"trx_id": trx_id, "status": status, "request_id": request_id}
+        self.records[trx_id] = record
+        async with self._lock:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._append, orjson.dumps(record) + b"\n"
+            )
+
+
+def submit_error_status(error: BaseException) -> str:
+    """
+    Статус журнала после ошибки sbp_start_refund: мог ли возврат быть создан.
+
+    ``NotSent`` — только если запрос точно не дошёл до банка (разомкнутая цепь,
+    ошибка соединения, 429), ``SubmitFailed`` — если банк отклонил запрос
+    с кодом 4xx. Любая другая ошибка, в том числе ошибка разбора успешного
+    ответа, оставляет ``Submitting``: возврат мог быть создан
+    """
+    if isinstance(error, (TochkaCircuitOpenError, ConnectError, ConnectTimeout)):
+        return JOURNAL_NOT_SENT
+    if isinstance(error, TochkaError) and not isinstance(
+        error, (TochkaServerError, TochkaClientError)
+    ):
+        if error.status_code == 429:
+            return JOURNAL_NOT_SENT
+        if 400 <= error.status_code < 500:
+            return JOURNAL_SUBMIT_FAILED
+    return JOURNAL_SUBMITTING
+
+
+class SbpBulkRefund:
+    """
+    Массовые возвраты через sbp_start_refund с защитой от повторного возврата.
+
+    Возвраты дедуплицируются по ``trx_id``. Перед отправкой и после неё
+    состояние записывается в ``RefundJournal``, поэтому повторный запуск
+    с тем же журналом не отправляет возврат ещё раз: уже созданные возвраты
+    только опрашиваются, завершённые сразу отдаются как результат.
+    Возврат, отправка которого была прервана или закончилась ошибкой, по которой
+    нельзя понять, дошёл ли запрос до банка (статус журнала ``Submitting``),
+    мог быть создан; он не отправляется повторно
+    и отдаётся с ошибкой для ручной сверки, если не указан
+    ``resubmit_interrupted=True``.
+
+    Отправка идёт не больше ``max_concurrency`` запросов одновременно.
+    Созданные возвраты опрашиваются через sbp_get_refund_data раундами
+    с интервалом от ``poll_interval`` до ``max_poll_interval`` секунд,
+    пока статус не станет Accepted или Rejected, но не дольше ``max_poll_time``.
+
+    Результаты (``SbpBulkRefundResult``) отдаются через ``async for``
+    по мере завершения возвратов.
+    """
+
+    def __init__(
+        self,
+        api,
+        refunds: Iterable[Mapping],
+        journal_path: str | Path,
+        max_concurrency: int = 4,
+        poll_interval: float = 2,
+        max_poll_interval: float = 30,
+        max_poll_time: float | None = None,
+        resubmit_interrupted: bool = False,
+        user_code: str | None = None,
+        **common_params,
+    ):
+        self.api = api
+        self.refunds: Iterable[Mapping] = refunds
+        self.journal: RefundJournal = RefundJournal(journal_path)
+        self.max_concurrency: int = max_concurrency
+        self.poll_interval: float = poll_interval
+        self.max_poll_interval: float = max_poll_interval
+        self.max_poll_time: float | None = max_poll_time
+        self.resubmit_interrupted: bool = resubmit_interrupted
+        self.user_code: str | None = user_code
+        self.common_params: dict = common_params | {"user_code": user_code}
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._polling: dict[str, str] = {}  # trx_id -> request_id
+        self._resumed: set[str] = set()
+        self._results: asyncio.Queue | None = None
+
+    def _result(self, trx_id: str, **fields) -> None:
+        self._results.put_nowait(
+            SbpBulkRefundResult.construct(
+                trx_id=trx_id, resumed=trx_id in self._resumed, **fields
+            )
+        )
+
+    def _plan(self) -> list[dict]:
+        """
+        Раскладывает возвраты по журналу: что отправить, что опросить,
+        что уже завершено
+        """
+        to_submit, seen = [], set()
+        for refund in self.refunds:
+            params = self.common_params | dict(refund)
+            trx_id = params["trx_id"]
+            if trx_id in seen:
+                continue
+            seen.add(trx_id)
+
+            record = self.journal.records.get(trx_id)
+            status = record["status"] if record is not None else None
+            if status is None or status == JOURNAL_NOT_SENT:
+                to_submit.append(params)
+                continue
+
+            self._resumed.add(trx_id)
+            if status == JOURNAL_SUBMITTING and self.resubmit_interrupted:
+                to_submit.append(params)
+            elif status == JOURNAL_SUBMITTING:
+                self._result(
+                    trx_id,
+                    status=status,
+                    error=RuntimeError(
+                        "refund submission was interrupted, the refund may exist"
+                    ),
+                )
+            elif status == JOURNAL_SUBMIT_FAILED or status in REFUND_TERMINAL_STATUSES:
+                self._result(trx_id, request_id=record["request_id"], status=status)
+            else:
+                self._polling[trx_id] = record["request_id"]
+        return to_submit
+
+    async def _submit(self, params: dict) -> None:
+        trx_id = params["trx_id"]
+        try:
+            # неверные параметры обнаруживаются до отправки и до записи в журнал
+            inspect.signature(self.api.sbp_start_refund).bind(**params)
+        except TypeError as error:
+            self._result(trx_id, status=JOURNAL_NOT_SENT, error=error)
+            return
+
+        async with self._semaphore:
+            await self.journal.write(trx_id, JOURNAL_SUBMITTING)
+            try:
+                response: SbpRefundResponse = await self.api.sbp_start_refund(**params)
+            except (Exception, TochkaError) as error:
+                status = submit_error_status(error)
+                if status != JOURNAL_SUBMITTING:
+                    await self.journal.write(trx_id, status)
+                self._result(trx_id, status=status, error=error)
+                return
+            await self.journal.write(trx_id, response.status, response.request_id)
+
+        if response.status in REFUND_TERMINAL_STATUSES:
+            self._result(
+                trx_id,
+                request_id=response.request_id,
+                status=response.status,
+                response=response,
+            )
+        else:
+            self._polling[trx_id] = response.request_id
+
+    async def _poll_one(self, trx_id: str, request_id: str) -> None:
+        async with self._semaphore:
+            try:
+                response: SbpRefundResponse = await self.api.sbp_get_refund_data(
+                    request_id, user_code=self.user_code
+                )
+            except (Exception, TochkaError):
+                return  # опрос повторится в следующем раунде
+            if response.status != self.journal.records[trx_id]["status"]:
+                await self.journal.write(trx_id, response.status, request_id)
+        if response.status in REFUND_TERMINAL_STATUSES:
+            self._polling.pop(trx_id, None)
+            self._result(
+                trx_id,
+                request_id=request_id,
+                status=response.status,
+                response=response,
+            )
+
+    async def _poll(self, submitting: asyncio.Future) -> None:
+        started = time.monotonic()
+        interval = self.poll_interval
+        while self._polling or not submitting.done():
+            await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+            if (
+                self.max_poll_time is not None
+                and time.monotonic() - started > self.max_poll_time
+            ):
+                break
+            await asyncio.gather(
+                *(
+                    self._poll_one(trx_id, request_id)
+                    for trx_id, request_id in list(self._polling.items())
+                )
+            )
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+        await submitting
+        # не дождались итогового статуса: возврат продолжит следующий запуск
+        for trx_id, request_id in self._polling.items():
+            self._result(
+                trx_id,
+                request_id=request_id,
+                status=self.journal.records[trx_id]["status"],
+            )
+        self._polling.clear()
+
+    async def __aiter__(self) -> AsyncIterator[SbpBulkRefundResult]:
+        self._results = asyncio.Queue()
+        await self.journal.aload()
+        to_submit = self._plan()
+
+        submitting = asyncio.ensure_future(
+            asyncio.gather(*(self._submit(params) for params in to_submit))
+        )
+        polling = asyncio.ensure_future(self._poll(submitting))
+        polling.add_done_callback(lambda _: self._results.put_nowait(_DONE))
+        try:
+            while (result := await self._results.get()) is not _DONE:
+                yield result
+            await polling  # ошибки самого исполнителя пробрасываются вызывающему
+        finally:
+            submitting.cancel()
+            polling.cancel()
+
+    async def run(self) -> list[SbpBulkRefundResult]:
+        return [result async for result in self]
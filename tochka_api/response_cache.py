@@ -0,0 +1,122 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable
+
+from httpx import Response
+
+
+def cacheable(function):
+    """
+    Помечает метод API, ответы которого можно хранить в ``ResponseCache``
+    """
+    function.cacheable = True
+    return function
+
+
+def invalidates(*endpoint_names: str):
+    """
+    Помечает метод API, после вызова которого кэш ответов указанных методов
+    этого пользователя сбрасывается
+    """
+
+    def decorator(function):
+        function.invalidates = endpoint_names
+        return function
+
+    return decorator
+
+
+class ResponseCache:
+    """
+    Кэш ответов медленно меняющихся методов API с TTL и вытеснением по LRU.
+
+    Ключ записи: (user_code, method, url, params). Кэшируются только методы,
+    помеченные ``cacheable``, и только успешные ответы. Методы, помеченные
+    ``invalidates``, сбрасывают записи связанных методов того же пользователя.
+
+    :param ttl: время жизни записи в секундах
+    :param maxsize: максимальное количество записей
+    :param endpoint_ttls: TTL для отдельных методов, ``0`` отключает кэш метода
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        maxsize: int = 1024,
+        endpoint_ttls: dict[str, float] | None = None,
+    ):
+        self.ttl: float = ttl
+        self.maxsize: int = maxsize
+        self.endpoint_ttls: dict[str, float] = endpoint_ttls or {}
+        self._entries: OrderedDict[Hashable, tuple[float, str, str, Response]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def ttl_for(self, endpoint_name: str) -> float:
+        return self.endpoint_ttls.get(endpoint_name, self.ttl)
+
+    @staticmethod
+    def freeze(mapping: dict | None) -> tuple:
+        """
+        Хэшируемое представление params, заголовков или cookies запроса
+        """
+        if not mapping:
+            return ()
+        return tuple(sorted((str(k), str(v)) for k, v in mapping.items()))
+
+    @staticmethod
+    def make_key(
+        user_code: str | None, method: str, url: str, params: dict | None
+    ) -> Hashable:
+        return user_code, method, url, ResponseCache.freeze(params)
+
+    def get(self, key: Hashable) -> Response | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[3]
+
+    def set(
+        self,
+        key: Hashable,
+        user_code: str | None,
+        endpoint_name: str,
+        response: Response,
+    ) -> None:
+        ttl = self.ttl_for(endpoint_name)
+        if ttl <= 0:
+            return
+        self._entries[key] = (
+            time.monotonic() + ttl,
+            user_code,
+            endpoint_name,
+            response,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(
+        self, user_code: str | None = None, endpoint_names: Iterable[str] | None = None
+    ) -> None:
+        """
+        Сбрасывает записи пользователя (или всех, если ``user_code=None``)
+        для указанных методов (или всех методов)
+        """
+        endpoint_names = set(endpoint_names) if endpoint_names is not None else None
+        for key, (_, entry_user_code, entry_endpoint, _) in list(self._entries.items()):
+            if user_code is not None and entry_user_code != user_code:
+                continue
+            if endpoint_names is not None and entry_endpoint not in endpoint_names:
+                continue
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,141 @@
+import random
+import time
+
+from httpx import Response
+from rate_limiter import parse_retry_after
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def idempotent(function):
+    """
+    Помечает метод API как безопасный для повтора, даже если он отправляет POST
+    """
+    function.idempotent = True
+    return function
+
+
+def not_idempotent(function):
+    """
+    Запрещает повтор метода API, даже если он отправляет GET/PUT/DELETE
+    """
+    function.idempotent = False
+    return function
+
+
+class RetryBudget:
+    """
+    Ограничивает долю повторов от общего числа запросов, чтобы во время сбоя
+    на стороне банка повторы не умножали нагрузку.
+
+    Каждый запрос пополняет бюджет на ``ratio``, каждый повтор тратит единицу.
+    Кроме того, бюджет пополняется на ``min_per_second`` в секунду,
+    чтобы при малом трафике повторы оставались возможны.
+    """
+
+    def __init__(
+        self, ratio: float = 0.1, min_per_second: float = 1, max_balance: float = 10
+    ):
+        self.ratio: float = ratio
+        self.min_per_second: float = min_per_second
+        self.max_balance: float = max_balance
+        self.balance: float = max_balance
+        self._updated_at: float = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.balance = min(
+            self.max_balance,
+            self.balance + (now - self._updated_at) * self.min_per_second,
+        )
+        self._updated_at = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class RetryPolicy:
+    """
+    Повтор методов API при ответах 5xx и сетевых ошибках
+    с экспоненциальной задержкой и полным джиттером.
+
+    Неидемпотентные методы (POST, если метод не помечен ``idempotent``)
+    не повторяются после ответа сервера: запрос мог быть выполнен.
+    Их можно повторить только при ошибке соединения, которая гарантирует,
+    что запрос не был отправлен (``httpx.ConnectError``, ``httpx.ConnectTimeout``).
+
+    Если ответ содержит Retry-After, повтор выполняется не раньше указанного
+    времени, а если оно больше ``max_delay`` - не выполняется вовсе.
+
+    :param max_attempts: максимальное число попыток, включая первую
+    :param base_delay: задержка перед первым повтором в секундах
+    :param max_delay: верхняя граница задержки в секундах
+    :param retry_statuses: коды ответа, при которых выполняется повтор
+    :param budget: бюджет повторов, по умолчанию ``RetryBudget()``
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5,
+        retry_statuses: frozenset[int] = frozenset({500, 502, 503, 504}),
+        budget: RetryBudget | None = None,
+    ):
+        self.max_attempts: int = max_attempts
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.retry_statuses: frozenset[int] = retry_statuses
+        self.budget: RetryBudget | None = (
+            budget if budget is not None else RetryBudget()
+        )
+
+    def on_request(self) -> None:
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def is_idempotent(self, method: str, endpoint_idempotent: bool | None) -> bool:
+        if endpoint_idempotent is not None:
+            return endpoint_idempotent
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def should_retry(
+        self, attempt: int, method: str, endpoint_idempotent: bool | None, sent: bool
+    ) -> bool:
+        """
+        :param attempt: номер завершившейся попытки, начиная с 1
+        :param sent: мог ли запрос дойти до сервера
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if sent and not self.is_idempotent(method, endpoint_idempotent):
+            return False
+        return self.budget is None or self.budget.withdraw()
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+    def retry_delay(self, attempt: int, response: Response | None) -> float | None:
+        """
+        Задержка перед повтором с учётом Retry-After ответа;
+        ``None``, если сервер просит ждать дольше ``max_delay``
+        """
+        delay = self.backoff(attempt)
+        if response is None:
+            return delay
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            return delay
+        if retry_after > self.max_delay:
+            return None
+        return max(delay, retry_after)
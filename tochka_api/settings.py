@@ -1,4 +1,8 @@
 HTTP_TIMEOUT: int = 10  # in seconds
+HTTP_MAX_CONNECTIONS: int = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+HTTP_KEEPALIVE_EXPIRY: float = 30  # in seconds
+TOKEN_EXPIRY_MARGIN: int = 10  # in seconds, token is refreshed this much earlier
 TOCHKA_BASE_API_URL: str = "https://enter.tochka.com/uapi"
 TOCHKA_SANDBOX_API_URL: str = "https://enter.tochka.com/sandbox/v2"
 TOCHKA_SANDBOX_VALID_TOKEN: str = "working_token"
@@ -1,19 +1,120 @@
+import asyncio
+import contextlib
+import functools
 import hashlib
+import os
+import sqlite3
+import threading
+import time
 from abc import ABC, abstractmethod
-from base64 import b64decode, b64encode
+from base64 import b64decode, b64encode, urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import MutableMapping
 from hashlib import md5
 from pathlib import Path
+from typing import AsyncContextManager, Callable, Iterable, Iterator, Mapping
 
 import orjson as orjson
 from appdirs import AppDirs
 from Cryptodome.Cipher import AES
 from models.tokens import Tokens
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+TOKENS_SALT = md5(b"whiteapfel").hexdigest().encode()
+
+
+def derive_key(client_id: str) -> bytes:
+    return hashlib.scrypt(client_id.encode(), salt=TOKENS_SALT, n=2, r=8, p=2, dklen=32)
+
+
+def encrypt_record(key: bytes, tokens_data: dict) -> bytes:
+    cipher = AES.new(key, AES.MODE_EAX)
+    ciphertext, tag = cipher.encrypt_and_digest(orjson.dumps(tokens_data))
+    return b64encode(cipher.nonce + tag + ciphertext)
+
+
+def decrypt_record(key: bytes, record: bytes) -> dict:
+    encrypted = b64decode(record)
+    nonce, tag, ciphertext = encrypted[:16], encrypted[16:32], encrypted[32:]
+    cipher = AES.new(key, AES.MODE_EAX, nonce)
+    return orjson.loads(cipher.decrypt_and_verify(ciphertext, tag))
+
+
+def lock_name(user_code: str) -> str:
+    return urlsafe_b64encode(user_code.encode()).decode().rstrip("=") + ".lock"
+
+
+class NoLease:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class FileLease:
+    """
+    Межпроцессная блокировка на файле через ``flock``.
+    Ожидание блокировки выполняется в потоке и не блокирует event loop.
+    """
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+        self._file = None
+
+    async def __aenter__(self):
+        if fcntl is None:
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, "a+b")
+        locking = asyncio.get_running_loop().run_in_executor(
+            None, fcntl.flock, lock_file.fileno(), fcntl.LOCK_EX
+        )
+        try:
+            await asyncio.shield(locking)
+        except asyncio.CancelledError:
+            # закрытие файла снимает блокировку, когда поток её всё-таки получит
+            locking.add_done_callback(lambda _: lock_file.close())
+            raise
+        except BaseException:
+            lock_file.close()
+            raise
+        self._file = lock_file
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Синхронный вариант ``FileLease`` для кода, выполняющегося в пуле потоков
+    """
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
 
 class AbstractTokenManager(ABC):
     def __init__(self, client_id: str, **kwargs):
         self.client_id = client_id
         self.tokens_mapper: dict[str, Tokens] = {}
+        self._pending_writes: set[asyncio.Task] = set()
+        self._write_lock = asyncio.Lock()
 
     @abstractmethod
     def on_update(self, user_code: str, tokens_data: Tokens) -> None:
@@ -29,6 +130,92 @@ class AbstractTokenManager(ABC):
     def load_tokens(self, **kwargs):
         ...
 
+    def flush(self) -> None:
+        pass
+
+    async def aflush(self) -> None:
+        """
+        Дожидается записи всех изменений, отправленных в пул потоков
+        """
+        while self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes))
+        self.flush()
+
+    async def aclose(self) -> None:
+        await self.aflush()
+
+    async def aload_tokens(self, **kwargs) -> None:
+        """
+        ``load_tokens`` в пуле потоков: вывод ключа, расшифровка и чтение с диска
+        не блокируют event loop
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.load_tokens, **kwargs)
+        )
+
+    async def aon_update(self, user_code: str, tokens_data: Tokens) -> None:
+        """
+        ``on_update``, который дожидается окончания записи в хранилище,
+        не блокируя event loop
+        """
+        self.on_update(user_code, tokens_data)
+        await self.aflush()
+
+    def _write_in_background(self, write: Callable, *args) -> None:
+        """
+        Внутри event loop выполняет запись в пуле потоков по очереди,
+        вне его - сразу
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            write(*args)
+            return
+        task = loop.create_task(self._write_in_executor(write, *args))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    async def _write_in_executor(self, write: Callable, *args) -> None:
+        async with self._write_lock:
+            await asyncio.get_running_loop().run_in_executor(None, write, *args)
+
+    def loaded_tokens(self) -> Mapping[str, Tokens]:
+        """
+        Токены, уже загруженные в память. Хранилища с ленивой загрузкой
+        не расшифровывают здесь токены, к которым ещё не обращались
+        """
+        return self.tokens_mapper
+
+    def refresh_lease(self, user_code: str) -> AsyncContextManager:
+        """
+        Блокировка, под которой обновляются токены пользователя. Хранилища,
+        общие для нескольких процессов, возвращают межпроцессную блокировку,
+        чтобы refresh-токен обновлял ровно один процесс.
+        """
+        return NoLease()
+
+    def reload_tokens(self, user_code: str) -> Tokens:
+        """
+        Перечитывает токены пользователя из хранилища, чтобы подхватить
+        обновление, сделанное другим процессом
+        """
+        return self.get_tokens(user_code)
+
+    async def aget_tokens(
+        self, user_code: str, allow_create: bool = False, **kwargs
+    ) -> Tokens:
+        """
+        ``get_tokens``, который читает и расшифровывает ещё не загруженные
+        токены в пуле потоков
+        """
+        return self.get_tokens(user_code, allow_create=allow_create, **kwargs)
+
+    async def areload_tokens(self, user_code: str) -> Tokens:
+        """
+        ``reload_tokens`` с чтением хранилища в пуле потоков
+        """
+        return self.reload_tokens(user_code)
+
 
 class InMemoryTokenManager(AbstractTokenManager):
     def __init__(self, client_id: str):
@@ -51,15 +238,38 @@ class InMemoryTokenManager(AbstractTokenManager):
 
 
 class LocalStorageTokenManager(AbstractTokenManager):
-    def __init__(self, client_id: str, tokens_path: str = None):
+    """
+    Хранит токены в зашифрованном файле.
+
+    Внутри event loop шифрование и запись файла выполняются в пуле потоков,
+    чтение в ``areload_tokens`` — тоже.
+    С ``write_behind=True`` изменения токенов не записываются сразу: они копятся
+    и сбрасываются на диск в фоне не позже чем через ``flush_interval`` секунд,
+    а также при ``flush``/``aclose``. Файл всегда перезаписывается атомарно.
+
+    Файл может быть общим для нескольких процессов: при записи файл
+    перечитывается под межпроцессной блокировкой, и в нём заменяются только
+    токены пользователей, изменённые этим процессом.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        tokens_path: str = None,
+        write_behind: bool = False,
+        flush_interval: float = 1.0,
+    ):
         super().__init__(client_id=client_id)
 
         self.json_dict = {}
+        self.write_behind: bool = write_behind
+        self.flush_interval: float = flush_interval
+        self._loading: bool = False
+        self._dirty: set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._flush_handle: asyncio.TimerHandle | None = None
 
-        self.salt = md5(b"whiteapfel").hexdigest().encode()
-        self.key = hashlib.scrypt(
-            client_id.encode(), salt=self.salt, n=2, r=8, p=2, dklen=32
-        )
+        self.salt = TOKENS_SALT
 
         self.tokens_path = Path(tokens_path) if tokens_path is not None else None
         if self.tokens_path is None:
@@ -72,19 +282,88 @@ class LocalStorageTokenManager(AbstractTokenManager):
                 self.tokens_path.touch()
                 self.save_all()
 
+    @functools.cached_property
+    def key(self) -> bytes:
+        return derive_key(self.client_id)
+
     def get_cipher(self):
         return AES.new(self.key, AES.MODE_EAX, b64decode(b"GAYGAY0WHITEAPFELGAYEw=="))
 
     def save_all(self):
-        json_string = orjson.dumps(self.json_dict)
+        self._save(self.json_dict)
+
+    def _save_users(self, user_codes: Iterable[str]) -> None:
+        """
+        Записывает токены пользователей ``user_codes`` поверх текущего файла,
+        не затрагивая записи других пользователей
+        """
+        with file_lock(self.tokens_path.parent / "locks" / "tokens.lock"):
+            exists = self.tokens_path.exists() and self.tokens_path.stat().st_size
+            json_dict = self._read() if exists else {}
+            # значения берутся под блокировкой: последняя запись сохраняет
+            # последнее состояние, даже если более старая запись ждала блокировку
+            for user_code in user_codes:
+                if user_code in self.json_dict:
+                    json_dict[user_code] = self.json_dict[user_code]
+            self._save(json_dict)
+
+    def _save(self, json_dict: dict):
+        json_string = orjson.dumps(json_dict)
         ciphertext, tag = self.get_cipher().encrypt_and_digest(json_string)
         encrypted_string = tag + ciphertext
         encoded_b64_string = b64encode(encrypted_string).decode()
-        self.tokens_path.write_text(encoded_b64_string)
+        tmp_path = self.tokens_path.with_name(
+            f"{self.tokens_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        tmp_path.write_text(encoded_b64_string)
+        os.replace(tmp_path, self.tokens_path)
 
     def on_update(self, user_code: str, tokens_data: Tokens) -> None:
         self.json_dict[user_code] = tokens_data.dump()[1]
-        self.save_all()
+        if self._loading:
+            return
+
+        with self._dirty_lock:
+            self._dirty.add(user_code)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if not self.write_behind:
+            self._schedule_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self.flush_interval, self._schedule_flush
+            )
+
+    def _schedule_flush(self) -> None:
+        self._flush_handle = None
+        self._write_in_background(self._flush_dirty)
+
+    def _flush_dirty(self) -> None:
+        # несколько изменений, накопившихся до начала записи, сохраняются одной записью
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if dirty:
+            self._save_users(dirty)
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._flush_dirty()
+
+    async def aflush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # запись идёт в пуле потоков по очереди с фоновыми записями
+        while self._dirty or self._pending_writes:
+            if self._dirty:
+                await self._write_in_executor(self._flush_dirty)
+            else:
+                await asyncio.gather(*list(self._pending_writes))
 
     def get_tokens(
         self, user_code: str, allow_create: bool = False, **kwargs
@@ -95,12 +374,453 @@ class LocalStorageTokenManager(AbstractTokenManager):
             )
         return self.tokens_mapper[user_code]
 
-    def load_tokens(self, **kwargs):
+    def refresh_lease(self, user_code: str) -> AsyncContextManager:
+        return FileLease(self.tokens_path.parent / "locks" / lock_name(user_code))
+
+    def reload_tokens(self, user_code: str) -> Tokens:
+        self.flush()
+        return self._apply_reloaded(user_code, self._read().get(user_code))
+
+    async def areload_tokens(self, user_code: str) -> Tokens:
+        await self.aflush()
+        json_dict = await asyncio.get_running_loop().run_in_executor(None, self._read)
+        return self._apply_reloaded(user_code, json_dict.get(user_code))
+
+    def _apply_reloaded(self, user_code: str, tokens_data: dict | None) -> Tokens:
+        tokens = self.get_tokens(user_code, allow_create=tokens_data is not None)
+        if tokens_data is not None:
+            self.json_dict[user_code] = tokens_data
+            self._loading = True
+            try:
+                tokens.load(user_code, tokens_data)
+            finally:
+                self._loading = False
+        return tokens
+
+    def _read(self) -> dict:
         encoded_b64_string = self.tokens_path.read_text()
         encrypted_string = b64decode(encoded_b64_string)
         tag, ciphertext = encrypted_string[:16], encrypted_string[16:]
         json_string = self.get_cipher().decrypt_and_verify(ciphertext, tag)
-        self.json_dict = orjson.loads(json_string)
-        for user_code, tokens_data in self.json_dict.items():
+        return orjson.loads(json_string)
+
+    def load_tokens(self, **kwargs):
+        self.json_dict = self._read()
+        self._loading = True
+        try:
+            for user_code, tokens_data in self.json_dict.items():
+                self.tokens_mapper[user_code] = Tokens(user_code, self.on_update)
+                self.tokens_mapper[user_code].load(user_code, tokens_data)
+        finally:
+            self._loading = False
+
+
+class LazyTokensMapper(MutableMapping):
+    """
+    ``tokens_mapper``, который расшифровывает токены пользователя
+    только при первом обращении к ним
+    """
+
+    def __init__(self, loader: Callable[[str], Tokens], user_codes: Iterable[str] = ()):
+        self._loader = loader
+        self._loaded: dict[str, Tokens] = {}
+        self._pending: set[str] = set(user_codes)
+
+    @property
+    def loaded(self) -> dict[str, Tokens]:
+        return self._loaded
+
+    def add_pending(self, user_code: str) -> None:
+        if user_code not in self._loaded:
+            self._pending.add(user_code)
+
+    def is_pending(self, user_code: str) -> bool:
+        return user_code in self._pending
+
+    def __getitem__(self, user_code: str) -> Tokens:
+        tokens = self._loaded.get(user_code)
+        if tokens is not None:
+            return tokens
+        if user_code not in self._pending:
+            raise KeyError(user_code)
+        tokens = self._loader(user_code)
+        self._pending.discard(user_code)
+        self._loaded[user_code] = tokens
+        return tokens
+
+    def __setitem__(self, user_code: str, tokens: Tokens) -> None:
+        self._pending.discard(user_code)
+        self._loaded[user_code] = tokens
+
+    def __delitem__(self, user_code: str) -> None:
+        if user_code in self._pending:
+            self._pending.discard(user_code)
+        else:
+            del self._loaded[user_code]
+
+    def __contains__(self, user_code) -> bool:
+        return user_code in self._loaded or user_code in self._pending
+
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self._loaded)
+        yield from list(self._pending)
+
+    def __len__(self) -> int:
+        return len(self._loaded) + len(self._pending)
+
+
+class EncryptedRecordsTokenManager(AbstractTokenManager):
+    """
+    Хранит токены каждого пользователя в отдельном зашифрованном файле
+    ``{tokens_dir}/{user_code}.token`` (имя в urlsafe base64).
+
+    Обновление токенов одного пользователя перезаписывает только его файл,
+    а при загрузке расшифровываются лишь токены, к которым действительно обращаются.
+    Каждая запись шифруется AES-EAX со своим случайным nonce.
+    """
+
+    record_suffix = ".token"
+
+    def __init__(self, client_id: str, tokens_dir: str = None):
+        super().__init__(client_id=client_id)
+
+        self._loading: bool = False
+        self.tokens_mapper: LazyTokensMapper = LazyTokensMapper(self._load_record)
+
+        self.tokens_dir = Path(tokens_dir) if tokens_dir is not None else None
+        if self.tokens_dir is None:
+            app_dirs = AppDirs("tochka_api", "whiteapfel")
+            self.tokens_dir = Path(
+                f"{app_dirs.user_data_dir}/{md5(self.client_id.encode()).hexdigest()}/tokens"
+            )
+        self.tokens_dir.mkdir(parents=True, exist_ok=True)
+
+    @functools.cached_property
+    def key(self) -> bytes:
+        return derive_key(self.client_id)
+
+    def record_path(self, user_code: str) -> Path:
+        name = urlsafe_b64encode(user_code.encode()).decode().rstrip("=")
+        return self.tokens_dir / f"{name}{self.record_suffix}"
+
+    @staticmethod
+    def user_code_from_path(path: Path) -> str:
+        name = path.name[: -len(EncryptedRecordsTokenManager.record_suffix)]
+        return urlsafe_b64decode(name + "=" * (-len(name) % 4)).decode()
+
+    def save_record(self, user_code: str, tokens_data: dict) -> None:
+        path = self.record_path(user_code)
+        tmp_path = path.with_name(
+            f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        tmp_path.write_bytes(encrypt_record(self.key, tokens_data))
+        os.replace(tmp_path, path)
+
+    def _read_record(self, user_code: str) -> dict:
+        return decrypt_record(self.key, self.record_path(user_code).read_bytes())
+
+    def _load_record(self, user_code: str) -> Tokens:
+        tokens = Tokens(user_code, self.on_update)
+        self._load_into(tokens, self._read_record(user_code))
+        return tokens
+
+    def _load_into(self, tokens: Tokens, tokens_data: dict) -> None:
+        self._loading = True
+        try:
+            tokens.load(tokens.user_code, tokens_data)
+        finally:
+            self._loading = False
+
+    def on_update(self, user_code: str, tokens_data: Tokens) -> None:
+        if self._loading:
+            return
+        self._write_in_background(self.save_record, user_code, tokens_data.dump()[1])
+
+    def get_tokens(
+        self, user_code: str, allow_create: bool = False, **kwargs
+    ) -> Tokens:
+        if allow_create and user_code not in self.tokens_mapper:
             self.tokens_mapper[user_code] = Tokens(user_code, self.on_update)
-            self.tokens_mapper[user_code].load(user_code, tokens_data)
+        return self.tokens_mapper[user_code]
+
+    def load_tokens(self, **kwargs):
+        for path in self.tokens_dir.glob(f"*{self.record_suffix}"):
+            self.tokens_mapper.add_pending(self.user_code_from_path(path))
+
+    def loaded_tokens(self) -> Mapping[str, Tokens]:
+        return self.tokens_mapper.loaded
+
+    def refresh_lease(self, user_code: str) -> AsyncContextManager:
+        return FileLease(self.tokens_dir / "locks" / lock_name(user_code))
+
+    def reload_tokens(self, user_code: str) -> Tokens:
+        tokens = self.tokens_mapper.loaded.get(user_code)
+        if tokens is None or not self.record_path(user_code).exists():
+            return self.get_tokens(user_code)
+        self._load_into(tokens, self._read_record(user_code))
+        return tokens
+
+    async def aget_tokens(
+        self, user_code: str, allow_create: bool = False, **kwargs
+    ) -> Tokens:
+        if self.tokens_mapper.is_pending(user_code):
+            tokens_data = await asyncio.get_running_loop().run_in_executor(
+                None, self._read_record, user_code
+            )
+            # пока запись читалась, токены могли загрузить синхронно
+            if self.tokens_mapper.is_pending(user_code):
+                tokens = Tokens(user_code, self.on_update)
+                self._load_into(tokens, tokens_data)
+                self.tokens_mapper[user_code] = tokens
+        return self.get_tokens(user_code, allow_create=allow_create, **kwargs)
+
+    async def areload_tokens(self, user_code: str) -> Tokens:
+        tokens = self.tokens_mapper.loaded.get(user_code)
+        if tokens is None:
+            return await self.aget_tokens(user_code)
+        try:
+            tokens_data = await asyncio.get_running_loop().run_in_executor(
+                None, self._read_record, user_code
+            )
+        except FileNotFoundError:
+            return tokens
+        self._load_into(tokens, tokens_data)
+        return tokens
+
+
+class SqliteTokenManager(AbstractTokenManager):
+    """
+    Хранит токены в SQLite (режим WAL), одна зашифрованная строка на user_code.
+
+    Рассчитан на несколько процессов с общей базой: каждая запись увеличивает
+    общий счётчик версий, а процессы не чаще раза в ``sync_interval`` секунд
+    проверяют ``PRAGMA data_version`` и перечитывают только строки с версией
+    новее уже увиденной. Токены пользователя читаются из базы
+    по первичному ключу при первом обращении.
+    """
+
+    def __init__(self, client_id: str, db_path: str = None, sync_interval: float = 0.5):
+        super().__init__(client_id=client_id)
+
+        self.sync_interval: float = sync_interval
+        self.tokens_mapper: LazyTokensMapper = LazyTokensMapper(self._load_row)
+        self._loading: bool = False
+        self._seen_version: int = 0
+        self._own_versions: set[int] = set()
+        self._data_version: int | None = None
+        self._synced_at: float = 0
+
+        self.db_path = Path(db_path) if db_path is not None else None
+        if self.db_path is None:
+            app_dirs = AppDirs("tochka_api", "whiteapfel")
+            self.db_path = Path(
+                f"{app_dirs.user_data_dir}/{md5(self.client_id.encode()).hexdigest()}/tokens.sqlite3"
+            )
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.connection = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False, timeout=30
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tokens (
+                user_code TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tokens_by_version ON tokens (version);
+            CREATE TABLE IF NOT EXISTS tokens_version (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO tokens_version (id, version) VALUES (0, 0);
+            """
+        )
+
+    @functools.cached_property
+    def key(self) -> bytes:
+        return derive_key(self.client_id)
+
+    @property
+    def version(self) -> int:
+        return self.connection.execute(
+            "SELECT version FROM tokens_version WHERE id = 0"
+        ).fetchone()[0]
+
+    def _make_tokens(self, user_code: str, tokens_data: dict) -> Tokens:
+        tokens = Tokens(user_code, self.on_update)
+        self._load_into(tokens, tokens_data)
+        return tokens
+
+    def _load_into(self, tokens: Tokens, tokens_data: dict) -> None:
+        self._loading = True
+        try:
+            tokens.load(tokens.user_code, tokens_data)
+        finally:
+            self._loading = False
+
+    def _read_row(self, user_code: str) -> dict | None:
+        row = self.connection.execute(
+            "SELECT data FROM tokens WHERE user_code = ?", (user_code,)
+        ).fetchone()
+        return decrypt_record(self.key, row[0]) if row is not None else None
+
+    def _load_row(self, user_code: str) -> Tokens:
+        tokens_data = self._read_row(user_code)
+        if tokens_data is None:
+            raise KeyError(user_code)
+        return self._make_tokens(user_code, tokens_data)
+
+    def save_row(self, user_code: str, tokens_data: dict) -> int:
+        record = encrypt_record(self.key, tokens_data)
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(
+                "UPDATE tokens_version SET version = version + 1 WHERE id = 0"
+            )
+            version = self.version
+            # версия помечается своей до коммита, чтобы sync из другого потока
+            # не успел применить эту строку поверх более новых токенов в памяти
+            self._own_versions.add(version)
+            try:
+                self.connection.execute(
+                    "INSERT INTO tokens (user_code, data, version) VALUES (?, ?, ?)"
+                    " ON CONFLICT (user_code) DO UPDATE"
+                    " SET data = excluded.data, version = excluded.version",
+                    (user_code, record, version),
+                )
+            except BaseException:
+                self._own_versions.discard(version)
+                raise
+        return version
+
+    def sync(self, force: bool = False) -> None:
+        """
+        Подхватывает изменения токенов, сделанные другими процессами
+        """
+        if self._sync_due(force):
+            self._apply_changes(self._read_changes(force))
+
+    async def sync_in_executor(self, force: bool = False) -> None:
+        """
+        ``sync`` с чтением базы и расшифровкой в пуле потоков
+        """
+        if self._sync_due(force):
+            changes = await asyncio.get_running_loop().run_in_executor(
+                None, self._read_changes, force
+            )
+            self._apply_changes(changes)
+
+    def _sync_due(self, force: bool) -> bool:
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_interval:
+            return False
+        self._synced_at = now
+        return True
+
+    def _read_changes(self, force: bool) -> list[tuple[str, dict | None, int]]:
+        (data_version,) = self.connection.execute("PRAGMA data_version").fetchone()
+        if not force and data_version == self._data_version:
+            return []
+        self._data_version = data_version
+
+        rows = self.connection.execute(
+            "SELECT user_code, data, version FROM tokens WHERE version > ?"
+            " ORDER BY version",
+            (self._seen_version,),
+        ).fetchall()
+        return [
+            (
+                user_code,
+                None
+                if version in self._own_versions
+                else decrypt_record(self.key, record),
+                version,
+            )
+            for user_code, record, version in rows
+        ]
+
+    def _apply_changes(self, changes: list[tuple[str, dict | None, int]]) -> None:
+        for user_code, tokens_data, version in changes:
+            self._seen_version = max(self._seen_version, version)
+            if version in self._own_versions:
+                # собственная запись: в памяти уже те же или более новые токены,
+                # а её фоновая запись могла отстать от следующего обновления
+                self._own_versions.discard(version)
+                continue
+            tokens = self.tokens_mapper.loaded.get(user_code)
+            if tokens is None:
+                self.tokens_mapper.add_pending(user_code)
+            else:
+                self._load_into(tokens, tokens_data)
+
+    def on_update(self, user_code: str, tokens_data: Tokens) -> None:
+        if self._loading:
+            return
+        self._write_in_background(self.save_row, user_code, tokens_data.dump()[1])
+
+    def get_tokens(
+        self, user_code: str, allow_create: bool = False, **kwargs
+    ) -> Tokens:
+        self.sync()
+        if user_code not in self.tokens_mapper:
+            try:
+                self.tokens_mapper[user_code] = self._load_row(user_code)
+            except KeyError:
+                if not allow_create:
+                    raise
+                self.tokens_mapper[user_code] = Tokens(user_code, self.on_update)
+        return self.tokens_mapper[user_code]
+
+    def load_tokens(self, **kwargs):
+        (self._data_version,) = self.connection.execute(
+            "PRAGMA data_version"
+        ).fetchone()
+        self._seen_version = self.version
+        self._own_versions.difference_update(
+            [
+                version
+                for version in list(self._own_versions)
+                if version <= self._seen_version
+            ]
+        )
+        for (user_code,) in self.connection.execute("SELECT user_code FROM tokens"):
+            self.tokens_mapper.add_pending(user_code)
+
+    def loaded_tokens(self) -> Mapping[str, Tokens]:
+        return self.tokens_mapper.loaded
+
+    def refresh_lease(self, user_code: str) -> AsyncContextManager:
+        return FileLease(self.db_path.parent / "locks" / lock_name(user_code))
+
+    def reload_tokens(self, user_code: str) -> Tokens:
+        self.sync(force=True)
+        return self.get_tokens(user_code)
+
+    async def aget_tokens(
+        self, user_code: str, allow_create: bool = False, **kwargs
+    ) -> Tokens:
+        await self.sync_in_executor()
+        if user_code not in self.tokens_mapper.loaded:
+            tokens_data = await asyncio.get_running_loop().run_in_executor(
+                None, self._read_row, user_code
+            )
+            if user_code not in self.tokens_mapper.loaded:
+                if tokens_data is not None:
+                    tokens = self._make_tokens(user_code, tokens_data)
+                elif allow_create:
+                    tokens = Tokens(user_code, self.on_update)
+                else:
+                    raise KeyError(user_code)
+                self.tokens_mapper[user_code] = tokens
+        return self.tokens_mapper[user_code]
+
+    async def areload_tokens(self, user_code: str) -> Tokens:
+        await self.sync_in_executor(force=True)
+        return await self.aget_tokens(user_code)
+
+    async def aclose(self) -> None:
+        await self.aflush()
+        self.connection.close()